@@ -0,0 +1,131 @@
+"""
+Cold start cost of the pbs modules. Every import is timed in a new python
+process, like a short lived command line wrapper pays it.
+
+Usage: python benchmarks/bench_import.py [--runs 20] [--real] [--importtime]
+           [--json results.json] [--compare old.json]
+
+  --real       : import the real _pbs and libtorque, default is the fake
+                 _pbs of fake_pbs.py
+  --importtime : show the slowest modules of python -X importtime (3.7+)
+
+The pbs package of this source tree is imported.
+
+The results can be saved as JSON and compared with the results of an
+other version, a ratio above 1 is slower than before.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+MODULES = ['pbs', 'pbs.PBSQuery', 'pbs.resmom', 'pbs.PBSBulk']
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+
+PATH = 'import sys; sys.path[:0] = [%r, %r]; ' % (os.path.dirname(BENCHMARKS), BENCHMARKS)
+FAKE = 'import fake_pbs; fake_pbs.install(0, 0); '
+
+
+def run(code):
+    return subprocess.check_output([sys.executable, '-c', code]).decode('utf-8')
+
+
+def prefix(fake):
+    """The code that runs before the import, it is not timed"""
+    if fake:
+        return PATH + FAKE
+    return PATH
+
+
+def measure(module, runs, fake):
+    """Return the seconds of import module in runs new processes"""
+    code = prefix(fake) + 'import time; t = time.time(); import %s; print(time.time() - t)' % module
+
+    times = []
+    for i in range(runs):
+        times.append(float(run(code)))
+    times.sort()
+    return {'best': times[0], 'median': times[len(times) // 2], 'runs': runs}
+
+
+def importtime(module, fake, count=15):
+    """Print the modules that take the longest to import, with their imports"""
+    code = prefix(fake) + 'import %s' % module
+
+    process = subprocess.Popen([sys.executable, '-X', 'importtime', '-c', code], stderr=subprocess.PIPE)
+    lines = process.communicate()[1].decode('utf-8').splitlines()
+
+    times = []
+    for line in lines[1:]:
+        self_us, cumulative, name = line.split(':', 1)[1].split('|')
+        times.append((int(cumulative), int(self_us), name.rstrip()))
+    times.sort(reverse=True)
+
+    print()
+    print('%-40s %10s %10s' % ('import %s' % module, 'us', 'self us'))
+    for cumulative, self_us, name in times[:count]:
+        print('%-40s %10d %10d' % (name, cumulative, self_us))
+
+
+def compare(results, old):
+    print()
+    print('%-24s %10s %10s %7s' % ('compared with', 'before', 'now', 'ratio'))
+    for name, now in results['results'].items():
+        before = old['results'].get(name)
+        if not before:
+            continue
+        print('%-24s %10.4f %10.4f %7.2f' % (name, before['median'], now['median'], now['median'] / before['median']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the import of the pbs modules')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--real', action='store_true', help='use the real _pbs module')
+    parser.add_argument('--importtime', action='store_true', help='show python -X importtime')
+    parser.add_argument('--json', help='save the results in this file')
+    parser.add_argument('--compare', help='compare with the results in this file')
+    args = parser.parse_args()
+
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'fake': not args.real,
+        'results': {},
+    }
+
+    print('%-24s %10s %10s' % ('import', 'best', 'median'))
+    for module in MODULES:
+        result = results['results'][module] = measure(module, args.runs, not args.real)
+        print('%-24s %10.4f %10.4f' % (module, result['best'], result['median']))
+        sys.stdout.flush()
+
+    if args.importtime:
+        if sys.version_info < (3, 7):
+            print('python -X importtime needs python 3.7')
+        else:
+            importtime('pbs.PBSQuery', not args.real)
+
+    if args.json:
+        f = open(args.json, 'w')
+        try:
+            json.dump(results, f, indent=2, sort_keys=True)
+        finally:
+            f.close()
+
+    if args.compare:
+        f = open(args.compare)
+        try:
+            compare(results, json.load(f))
+        finally:
+            f.close()
+
+
+if __name__ == '__main__':
+    main()
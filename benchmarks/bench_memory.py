@@ -0,0 +1,142 @@
+"""
+Memory used per job object of PBSQuery, compared with the UserDict based
+objects of the baseline PBSQuery. Both parse the same jobs from the fake
+_pbs of fake_pbs.py, no pbs_server or libtorque is needed.
+
+Usage: python benchmarks/bench_memory.py [--jobs 100000]
+           [--baseline PBSQuery.py | --baseline-ref git-ref]
+
+  --baseline     : the old PBSQuery.py to compare with
+  --baseline-ref : a git ref of this repository, eg: the tag of the last
+                   release with the UserDict objects, its pbs/PBSQuery.py
+                   is compared with
+
+The old PBSQuery.py is a python 2 module. Without a baseline, or with
+python 3, only the current objects are measured.
+
+Two cases are measured, jobs that have the same Variable_List names and
+jobs that each have other names, eg: the tasks of a job array that get
+their own variables. The number of shared shapes is shown, it must not grow
+with the varying names.
+"""
+from __future__ import print_function
+
+import argparse
+import gc
+import os
+import subprocess
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fake_pbs
+
+FAKE = fake_pbs.install(0, 0)
+
+from pbs import PBSQuery
+
+
+def make_jobs(njobs, vary):
+    """
+    The jobs of the fake cluster. The SWIG wrapper returns new string
+    objects for every attribute, so the names are not shared between jobs.
+    """
+    jobs = fake_pbs.make_cluster(njobs // 10 + 1, njobs)[1]
+    for i, job in enumerate(jobs):
+        for a in job.attribs:
+            a.name = a.name[:1] + a.name[1:]
+            if a.resource:
+                a.resource = a.resource[:1] + a.resource[1:]
+            if vary and a.name == 'Variable_List':
+                a.value += ',TASK_%d=%d,INPUT_%d=input%d' % (i, i, i % 1000, i)
+    return jobs
+
+
+def load_baseline(filename, ref):
+    """Import the old PBSQuery.py as pbs.PBSQuery_baseline, it uses the fake _pbs too"""
+    if filename:
+        f = open(filename)
+        try:
+            source = f.read()
+        finally:
+            f.close()
+    else:
+        filename = '%s:pbs/PBSQuery.py' % ref
+        source = subprocess.check_output(['git', '-C', ROOT, 'show', filename])
+
+    # The old module does 'import pbs', inside the package that is pbs.pbs
+    #
+    module = types.ModuleType('pbs.PBSQuery_baseline')
+    module.__file__ = filename
+    sys.modules[module.__name__] = module
+    exec(compile(source, filename, 'exec', 0, True), module.__dict__)
+    return module
+
+
+def deep_sizeof(obj, seen):
+    """Size of obj and everything it refers to that is not in seen"""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deep_sizeof(key, seen) + deep_sizeof(value, seen)
+    elif isinstance(obj, (list, tuple, set)):
+        for value in obj:
+            size += deep_sizeof(value, seen)
+    elif not isinstance(obj, (str, int, float, type(None))):
+        if hasattr(obj, '__dict__'):
+            size += deep_sizeof(obj.__dict__, seen)
+        for cls in getattr(type(obj), '__mro__', ()):
+            for slot in cls.__dict__.get('__slots__', ()):
+                if hasattr(obj, slot):
+                    size += deep_sizeof(getattr(obj, slot), seen)
+    return size
+
+
+def count_shapes(shape):
+    return 1 + sum([count_shapes(s) for s in shape._next.values()])
+
+
+def measure(label, query, njobs):
+    gc.collect()
+    jobs = query.getjobs()
+    size = deep_sizeof(jobs, set())
+    print('%-20s %12d bytes %8d bytes/job' % (label, size, size // njobs))
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory of the PBSQuery job objects')
+    parser.add_argument('--jobs', type=int, default=100000)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--baseline', help='the old PBSQuery.py')
+    group.add_argument('--baseline-ref', help='the git ref of the old PBSQuery.py')
+    args = parser.parse_args()
+
+    baseline = None
+    if not (args.baseline or args.baseline_ref):
+        print('No baseline given, only the current objects are measured')
+    elif sys.version_info[0] == 2:
+        baseline = load_baseline(args.baseline, args.baseline_ref)
+    else:
+        print('The baseline PBSQuery needs python 2, only the current objects are measured')
+
+    for vary in (False, True):
+        FAKE.jobs = make_jobs(args.jobs, vary)
+        print()
+        print('%d jobs, %s Variable_List names' % (args.jobs, vary and 'varying' or 'the same'))
+
+        after = measure('PBSQuery', PBSQuery.PBSQuery('master'), args.jobs)
+        if baseline:
+            before = measure('baseline PBSQuery', baseline.PBSQuery('master'), args.jobs)
+            print('%.1f%% of the baseline size' % (100.0 * after / before))
+        print('%d job shapes' % count_shapes(PBSQuery.job._root_shape))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Time PBSQuery on a synthetic cluster, without a pbs_server. The _pbs
+module is replaced by fake_pbs, so this measures pbs.py, PBSQuery and the
+batch objects: converting the pbs_stat*() lists, getjobs()/getnodes(),
+job.get_nodes(), node.get_jobs() and convert_range().
+
+Usage: python benchmarks/bench_pbsquery.py [--nodes 10000] [--jobs 200000]
+           [--repeat 3] [--json results.json] [--compare old.json]
+
+The results can be saved as JSON and compared with the results of an
+other version, a ratio above 1 is slower than before.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fake_pbs
+
+
+def measure(func, repeat):
+    """Return the best and mean seconds of repeat calls of func"""
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+    return {'best': min(times), 'mean': sum(times) / len(times), 'repeat': repeat}
+
+
+def benchmarks(fake, PBSQuery):
+    """Return a list of (name, function), the data they need is made first"""
+    p = PBSQuery.PBSQuery('master')
+    jobs = p.getjobs()
+    nodes = p.getnodes()
+
+    lazy = PBSQuery.PBSQuery('master')
+    lazy.lazy_data_structure()
+
+    ranges = [a.value.split('/')[1] for j in fake.jobs for a in j.attribs if a.name == 'exec_host' and a.value]
+    ranges = [r for host in ranges for r in host.split('+')[:1]]
+
+    return [
+        ('list_2_dict.jobs', lambda: p._list_2_dict(fake.jobs, PBSQuery.job)),
+        ('list_2_dict.nodes', lambda: p._list_2_dict(fake.nodes, PBSQuery.node)),
+        ('getjobs', lambda: p.getjobs()),
+        ('getjobs.job_state', lambda: p.getjobs(['job_state'])),
+        ('getjobs.lazy', lambda: lazy.getjobs()),
+        ('getnodes', lambda: p.getnodes()),
+        ('getnodes.lazy', lambda: lazy.getnodes()),
+        ('job.get_nodes', lambda: [j.get_nodes() for j in jobs.values()]),
+        ('job.get_nodes.compact', lambda: [j.get_nodes(compact=True) for j in jobs.values()]),
+        ('node.get_jobs', lambda: [n.get_jobs() for n in nodes.values()]),
+        ('node.get_jobs.compact', lambda: [n.get_jobs(compact=True) for n in nodes.values()]),
+        ('convert_range', lambda: [PBSQuery.convert_range(r) for r in ranges]),
+    ]
+
+
+def compare(results, old):
+    print()
+    print('%-24s %10s %10s %7s' % ('compared with', 'before', 'now', 'ratio'))
+    for name, now in results['results'].items():
+        before = old['results'].get(name)
+        if not before:
+            continue
+        print('%-24s %10.4f %10.4f %7.2f' % (name, before['best'], now['best'], now['best'] / before['best']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time PBSQuery on a synthetic cluster')
+    parser.add_argument('--nodes', type=int, default=10000)
+    parser.add_argument('--jobs', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='save the results in this file')
+    parser.add_argument('--compare', help='compare with the results in this file')
+    args = parser.parse_args()
+
+    start = time.time()
+    fake = fake_pbs.install(args.nodes, args.jobs)
+    from pbs import PBSQuery
+    print('%d nodes, %d jobs made in %.1f seconds' % (args.nodes, args.jobs, time.time() - start))
+
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'nodes': args.nodes,
+        'jobs': args.jobs,
+        'results': {},
+    }
+
+    print('%-24s %10s %10s' % ('benchmark', 'best', 'mean'))
+    for name, func in benchmarks(fake, PBSQuery):
+        result = results['results'][name] = measure(func, args.repeat)
+        print('%-24s %10.4f %10.4f' % (name, result['best'], result['mean']))
+        sys.stdout.flush()
+
+    if args.json:
+        f = open(args.json, 'w')
+        try:
+            json.dump(results, f, indent=2, sort_keys=True)
+        finally:
+            f.close()
+
+    if args.compare:
+        f = open(args.compare)
+        try:
+            compare(results, json.load(f))
+        finally:
+            f.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Compare the regular expressions with split_brace() for splitting node
+status values, like _PBSobject._add_attrib() does for 'status' and
+'Variable_List'.
+
+Usage: python benchmarks/bench_status_parser.py [jobs per node, default 7]
+
+The _pbs module is replaced by fake_pbs, no libtorque is needed.
+"""
+from __future__ import print_function
+
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fake_pbs
+
+fake_pbs.install(0, 0)
+
+from pbs import PBSQuery
+
+
+def make_status(njobs):
+    """A node status like the example in PBSQuery, with njobs jobs"""
+    jobs = ' '.join(['%d[1].master(cput=%d,energy_used=0,mem=%dkb,vmem=368184kb,walltime=7391,session_id=%d)'
+                     % (400 + i, 7000 + i, 200000 + i, 30000 + i) for i in range(njobs)])
+    sessions = ' '.join([str(30000 + i) for i in range(njobs)])
+    return ('rectime=1424696750,macaddr=40:a8:f0:2f:17:f4,cpuclock=Fixed,varattr=,jobs=%s,'
+            'state=free,size=456341748kb:459945088kb,netload=587288451179,gres=,loadave=18.07,'
+            'ncpus=24,physmem=65850220kb,availmem=77961112kb,totmem=86821736kb,idletime=13933,'
+            'nusers=1,nsessions=%d,sessions=%s,'
+            'uname=Linux node24 3.10.0 #1 SMP Wed Feb 4 08:16:54 CET 2015 x86_64,opsys=linux'
+            % (jobs, njobs, sessions))
+
+
+def split_regex(status):
+    return [[y[1] for y in PBSQuery.REG_SPLIT_EQUAL_BRACE.findall(x[1])]
+            for x in PBSQuery.REG_SPLIT_COMMA_BRACE.findall(status)]
+
+
+def split_str(status):
+    return [PBSQuery.split_brace(x, '=') for x in PBSQuery.split_brace(status, ',')]
+
+
+def main():
+    if len(sys.argv) > 1:
+        njobs = int(sys.argv[1])
+    else:
+        njobs = 7
+
+    status = make_status(njobs)
+    assert split_regex(status) == split_str(status)
+
+    number = 20000
+    print('status of %d characters, %d jobs' % (len(status), njobs))
+    for label, func in [('regex', split_regex), ('split_brace', split_str)]:
+        best = min(timeit.repeat(lambda: func(status), number=number, repeat=3))
+        print('%-12s %8.2f us/status' % (label, best / number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
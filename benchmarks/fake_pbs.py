@@ -0,0 +1,244 @@
+"""
+A fake _pbs module for benchmarks, it answers the pbs_stat*() calls with
+a synthetic cluster instead of asking a pbs_server. The real pbs.py and
+PBSQuery run on top of it, so everything above the SWIG layer is timed.
+
+    import fake_pbs
+    fake = fake_pbs.install(nodes=10000, jobs=200000)
+    from pbs import PBSQuery
+
+install() must be called before the pbs package is imported. The
+batch_status and attrl objects are linked with next like the C structures,
+the pbs_stat*() functions return them as a list like the SWIG typemaps do.
+"""
+import random
+import sys
+
+PPN = 24
+CORES_PER_JOB = (1, 2, 4, 8, 8, 16, 24, 48)
+
+
+class Attrl(object):
+    __slots__ = ('name', 'resource', 'value', 'op', 'next')
+
+    def __init__(self, name=None, resource=None, value=None):
+        self.name = name
+        self.resource = resource
+        self.value = value
+        self.next = None
+
+
+class BatchStatus(object):
+    __slots__ = ('name', 'attribs', 'text', 'next')
+
+    def __init__(self, name, attribs):
+        self.name = name
+        self.attribs = attribs
+        self.text = None
+        self.next = None
+
+
+def _link(objects):
+    for i in range(len(objects) - 1):
+        objects[i].next = objects[i + 1]
+    return objects
+
+
+def _item(name, attribs):
+    return BatchStatus(name, _link([Attrl(*a) for a in attribs]))
+
+
+def _ranges(cores):
+    """[0, 1, 2, 5] -> '0-2,5'"""
+    ranges = []
+    for core in cores:
+        if ranges and ranges[-1][1] == core - 1:
+            ranges[-1][1] = core
+        else:
+            ranges.append([core, core])
+    return ','.join([a == b and str(a) or '%d-%d' % (a, b) for a, b in ranges])
+
+
+def _job_attribs(i, exec_host, cores):
+    user = 'user%03d' % (i % 300)
+    attribs = [
+        ('Job_Name', None, 'simulation_%d' % i),
+        ('Job_Owner', None, '%s@login01' % user),
+        ('job_state', None, exec_host and 'R' or 'Q'),
+        ('queue', None, ('batch', 'long', 'short')[i % 3]),
+        ('server', None, 'master'),
+        ('ctime', None, '%d' % (1424690000 + i)),
+        ('mtime', None, '%d' % (1424690100 + i)),
+        ('qtime', None, '%d' % (1424690000 + i)),
+        ('Resource_List', 'nodect', '%d' % max(1, cores // PPN)),
+        ('Resource_List', 'nodes', '%d:ppn=%d' % (max(1, cores // PPN), min(cores, PPN))),
+        ('Resource_List', 'walltime', '24:00:00'),
+        ('Variable_List', None, 'PBS_O_QUEUE=batch,PBS_O_HOME=/home/%s,PBS_O_LOGNAME=%s,'
+                                'PBS_O_PATH=/usr/local/bin:/usr/bin:/bin,PBS_O_SHELL=/bin/bash,'
+                                'PBS_O_WORKDIR=/home/%s/run,PBS_O_HOST=login01' % (user, user, user)),
+        ('euser', None, user),
+        ('egroup', None, 'users'),
+    ]
+    if exec_host:
+        attribs.extend([
+            ('exec_host', None, exec_host),
+            ('resources_used', 'cput', '12:34:56'),
+            ('resources_used', 'mem', '%dkb' % (1000000 + i)),
+            ('resources_used', 'vmem', '%dkb' % (2000000 + i)),
+            ('resources_used', 'walltime', '01:23:45'),
+            ('session_id', None, '%d' % (10000 + i)),
+            ('start_time', None, '%d' % (1424690200 + i)),
+        ])
+    return attribs
+
+
+def _node_attribs(i, jobs):
+    """jobs is a list of (cores, jobid) running on the node"""
+    attribs = [
+        ('state', None, jobs and 'job-exclusive' or 'free'),
+        ('np', None, str(PPN)),
+        ('properties', None, 'batch,ib,rack%02d' % (i // 40)),
+        ('ntype', None, 'cluster'),
+    ]
+    if jobs:
+        attribs.append(('jobs', None, ','.join(['%s/%s' % (_ranges(cores), jobid) for cores, jobid in jobs])))
+
+    running = ' '.join(['%s(cput=7391,energy_used=0,mem=200000kb,vmem=368184kb,walltime=7391,session_id=%d)'
+                        % (jobid, 30000 + n) for n, (cores, jobid) in enumerate(jobs)])
+    sessions = ' '.join([str(30000 + n) for n in range(len(jobs))])
+    attribs.append(('status', None,
+        'rectime=1424696750,macaddr=40:a8:f0:2f:17:f4,cpuclock=Fixed,varattr=,jobs=%s,'
+        'state=free,size=456341748kb:459945088kb,netload=587288451179,gres=,loadave=18.07,'
+        'ncpus=%d,physmem=65850220kb,availmem=77961112kb,totmem=86821736kb,idletime=13933,'
+        'nusers=1,nsessions=%d,sessions=%s,'
+        'uname=Linux node%05d 3.10.0 #1 SMP Wed Feb 4 08:16:54 CET 2015 x86_64,opsys=linux'
+        % (running, PPN, len(jobs), sessions or '? 0', i)))
+    return attribs
+
+
+def make_cluster(nnodes, njobs):
+    """
+    Return (nodes, jobs), lists of BatchStatus. The jobs fill the cores of
+    the nodes in order, the jobs that do not fit are queued.
+    """
+    node_jobs = [[] for i in range(nnodes)]
+    node, core = 0, 0
+
+    jobs = []
+    for i in range(njobs):
+        jobid = '%d.master' % i
+        cores = CORES_PER_JOB[i % len(CORES_PER_JOB)]
+
+        hosts = []
+        if node < nnodes and cores <= (nnodes - node) * PPN - core:
+            need = cores
+            while need:
+                take = min(need, PPN - core)
+                used = list(range(core, core + take))
+                node_jobs[node].append((used, jobid))
+                hosts.append('node%05d/%s' % (node, _ranges(used)))
+                need -= take
+                core += take
+                if core == PPN:
+                    node, core = node + 1, 0
+
+        jobs.append(_item(jobid, _job_attribs(i, '+'.join(hosts), cores)))
+
+    nodes = [_item('node%05d' % i, _node_attribs(i, node_jobs[i])) for i in range(nnodes)]
+    return _link(nodes), _link(jobs)
+
+
+class FakePBS(object):
+    """Used as the _pbs module, unknown functions return None"""
+
+    PBSE_NONE = 0
+    PBSE_ = 15000
+    PBS_MOM_SERVICE_PORT = 15002
+    SET, UNSET, INCR, DECR = 0, 1, 2, 3
+    EQ, NE, GE, GT, LE, LT = 4, 5, 6, 7, 8, 9
+
+    def __init__(self, nodes, jobs):
+        self.nodes = nodes
+        self.jobs = jobs
+        self.queues = [_item(q, [('queue_type', None, 'Execution'), ('enabled', None, 'True'),
+                                 ('started', None, 'True')]) for q in ('batch', 'long', 'short')]
+        self.server = [_item('master', [('pbs_version', None, '4.2.10'), ('server_state', None, 'Active')])]
+        self._selected = {}
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if name[0].isupper():
+            return name
+        return lambda *args: None
+
+    def new_attrl(self, n):
+        """Like the C function op is not initialized"""
+        attribs = _link([Attrl() for i in range(n)])
+        for a in attribs:
+            a.op = random.randrange(2 ** 31)
+        return attribs
+
+    def new_attropl(self, n):
+        return _link([Attrl() for i in range(n)])
+
+    def pbs_default(self):
+        return 'master'
+
+    def pbs_query_max_connections(self):
+        return 8
+
+    def pbs_connect(self, server):
+        return 1
+
+    def pbs_disconnect(self, con):
+        return 0
+
+    def get_error(self):
+        return 0
+
+    def pbs_strerror(self, code):
+        return ''
+
+    def pbs_statfree(self, l):
+        pass
+
+    def _stat(self, kind, objects, name, attribs):
+        """Like the pbs_server only return the requested attributes"""
+        if name:
+            objects = [o for o in objects if o.name == name]
+
+        if attribs == 'NULL' or not attribs:
+            return list(objects)
+
+        names = tuple(sorted(set([a.name for a in attribs])))
+        key = (kind, name, names)
+        if key not in self._selected:
+            self._selected[key] = [BatchStatus(o.name, [a for a in o.attribs if a.name in names]) for o in objects]
+        return list(self._selected[key])
+
+    def pbs_statserver(self, con, attribs, extend):
+        return self._stat('server', self.server, '', attribs)
+
+    def pbs_statque(self, con, name, attribs, extend):
+        return self._stat('queue', self.queues, name, attribs)
+
+    def pbs_statnode(self, con, name, attribs, extend):
+        return self._stat('node', self.nodes, name, attribs)
+
+    def pbs_statjob(self, con, name, attribs, extend):
+        return self._stat('job', self.jobs, name, attribs)
+
+
+def install(nodes=10000, jobs=200000):
+    """
+    Make a cluster and use it as the _pbs module, return the FakePBS. The
+    pbs.py wrapper imports pbs._pbs, that is the fake.
+    """
+    if 'pbs.pbs' in sys.modules:
+        raise RuntimeError('install() must be called before the pbs package is imported')
+
+    fake = FakePBS(*make_cluster(nodes, jobs))
+    sys.modules['_pbs'] = fake
+    sys.modules['pbs._pbs'] = fake
+    return fake
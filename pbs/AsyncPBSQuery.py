@@ -0,0 +1,214 @@
+"""
+Usage: from pbs.AsyncPBSQuery import AsyncPBSQuery
+
+asyncio interface for PBSQuery, Python 3 only. The pbs_* library calls
+block and keep the GIL, so they are run in a pool of worker processes and
+awaited. Every worker process has its own PBSQuery object:
+
+    async def poll():
+        async with AsyncPBSQuery('master', timeout=30) as p:
+            jobs, nodes = await asyncio.gather(p.getjobs(['job_state']), p.getnodes())
+            errors = await p.deljobs(['1.master', '2.master'])
+
+At most max_concurrency calls are running on the pbs_server at the same
+time, default is pbs_query_max_connections(). Calls that wait for their
+turn can be cancelled. A call that is already running in a worker can not
+be interrupted; when it is cancelled, or times out, the result is dropped
+and the call keeps its worker until it returns. The event loop keeps
+running during the library calls, so the timeout is enforced. close()
+terminates the workers, also the ones that are stuck in a call.
+
+The results are pickled from the worker to the event loop process.
+"""
+import asyncio
+import multiprocessing
+import threading
+
+from . import pbs
+from .PBSQuery import PBSQuery, connection_error
+
+#
+# The PBSQuery object of a worker process, made by _init_worker
+#
+_worker_query = None
+
+
+def _init_worker(server, pool):
+    """Initializer of the worker processes"""
+    global _worker_query
+    _worker_query = PBSQuery(server, pool=pool)
+
+
+def _call(method, *args):
+    """Worker function, call method of the PBSQuery object"""
+    return getattr(_worker_query, method)(*args)
+
+
+def _jobcall(name, jobid, *args):
+    """
+    Worker function, call pbs.name(con, jobid, *args, extend) and return the
+    pbs error code. The call is never repeated, the job may have been
+    changed already. Also with a proxy the job calls go to the pbs_server.
+    """
+    query = _worker_query
+    if query.pool:
+        con = query.pool.acquire()
+    else:
+        con = query._connect()
+
+    rc = -1
+    try:
+        rc = getattr(pbs, name)(con, jobid, *(args + ('NULL',)))
+        if rc == -1:
+            rc = pbs.error()[0] or rc
+    finally:
+        if query.pool:
+            query.pool.release(con, broken=connection_error(rc))
+        else:
+            query._disconnect(con)
+    return rc
+
+
+class AsyncPBSQuery:
+
+    def __init__(self, server=None, pool=True, max_concurrency=None, timeout=None):
+        """
+        server          : the pbs_server to query, default is pbs_default()
+        pool            : passed on to the PBSQuery object of every worker,
+                          default is a private PBSConnectionPool per worker
+        max_concurrency : maximum number of calls at the same time and the
+                          number of worker processes, default is
+                          pbs_query_max_connections()
+        timeout         : seconds to wait for a call, default is no timeout,
+                          raises asyncio.TimeoutError
+        """
+        if not server:
+            server = pbs.pbs_default()
+        self.server = server
+
+        if not max_concurrency:
+            max_concurrency = pbs.pbs_query_max_connections()
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+
+        self.workers = multiprocessing.Pool(max_concurrency, _init_worker, (server, pool))
+
+        # A semaphore belongs to the loop it is used in, one per loop
+        #
+        self._limits = {}
+        self._limits_lock = threading.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Terminate the worker processes, the running calls are not waited for"""
+        self.workers.terminate()
+
+    def _limit(self, loop):
+        """Return the semaphore of loop, it is made on first use"""
+        with self._limits_lock:
+            limit = self._limits.get(loop)
+            if limit is None:
+                limit = self._limits[loop] = asyncio.Semaphore(self.max_concurrency)
+            for l in list(self._limits):
+                if l.is_closed():
+                    del self._limits[l]
+            return limit
+
+    async def _run(self, func, *args):
+        """
+        Run func(*args) in a worker when a slot is free, wait at most
+        timeout seconds for the slot and the result together
+        """
+        return await asyncio.wait_for(self._submit(func, *args), self.timeout)
+
+    async def _submit(self, func, *args):
+        loop = asyncio.get_event_loop()
+        limit = self._limit(loop)
+
+        await limit.acquire()
+        future = loop.create_future()
+
+        # Keep the slot until the worker is done, also when we stop waiting
+        #
+        def finish(result, error):
+            limit.release()
+            if future.done():
+                pass
+            elif error:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        def done(result, error=None):
+            """Called in the result thread of the pool"""
+            try:
+                loop.call_soon_threadsafe(finish, result, error)
+            except RuntimeError:
+                # The loop is closed
+                pass
+
+        try:
+            self.workers.apply_async(func, args, callback=done,
+                                     error_callback=lambda error: done(None, error))
+        except BaseException:
+            limit.release()
+            raise
+        return await future
+
+    async def get_serverinfo(self, attrib_list=None):
+        return await self._run(_call, 'get_serverinfo', attrib_list)
+
+    async def getqueue(self, name, attrib_list=None):
+        return await self._run(_call, 'getqueue', name, attrib_list)
+
+    async def getqueues(self, attrib_list=None):
+        return await self._run(_call, 'getqueues', attrib_list)
+
+    async def getnode(self, name, attrib_list=None):
+        return await self._run(_call, 'getnode', name, attrib_list)
+
+    async def getnodes(self, attrib_list=None):
+        return await self._run(_call, 'getnodes', attrib_list)
+
+    async def getjob(self, name, attrib_list=None):
+        return await self._run(_call, 'getjob', name, attrib_list)
+
+    async def getjobs(self, attrib_list=None, select=None):
+        return await self._run(_call, 'getjobs', attrib_list, select)
+
+    async def _bulk(self, name, jobids, *args):
+        """
+        Call pbs.name for every job at the same time, within the concurrency
+        limit. Returns a dictionary jobid: error code, 0 is success, see
+        pbs.pbs_strerror(). When a call fails or times out, the calls that did
+        not start are cancelled.
+        """
+        jobids = list(jobids)
+        calls = [asyncio.ensure_future(self._run(_jobcall, name, j, *args)) for j in jobids]
+        try:
+            codes = await asyncio.gather(*calls)
+        except BaseException:
+            for c in calls:
+                c.cancel()
+            raise
+        return dict(zip(jobids, codes))
+
+    async def deljobs(self, jobids):
+        return await self._bulk('pbs_deljob', jobids)
+
+    async def holdjobs(self, jobids, hold_type='u'):
+        return await self._bulk('pbs_holdjob', jobids, hold_type)
+
+    async def rlsjobs(self, jobids, hold_type='u'):
+        return await self._bulk('pbs_rlsjob', jobids, hold_type)
+
+    async def sigjobs(self, jobids, signal):
+        return await self._bulk('pbs_sigjob', jobids, signal)
+
+    async def rerunjobs(self, jobids):
+        return await self._bulk('pbs_rerunjob', jobids)
@@ -0,0 +1,301 @@
+"""
+Usage: from pbs.PBSBulk import PBSBulk
+
+Run a pbs job operation on many jobs. The calls are made one after the
+other on a connection of a PBSConnectionPool, so no connection is made
+per job. The library calls hold the GIL, threads would not overlap them.
+Where the library has an asynchronous variant it is used by default:
+pbs_deljob with DELASYNC, pbs_sigjobasync, pbs_alterjob_async and
+pbs_asyrunjob return as soon as the pbs_server accepted the request.
+
+    bulk = PBSBulk('master')
+    result = bulk.delete_jobs(['1.master', '2.master'])
+    for jobid, code in result.failed().items():
+        print jobid, pbs.pbs_strerror(code)
+    print result.throughput(), 'jobs/s'
+    bulk.close()
+
+Many jobs are submitted with submit_jobs(). The attributes that the jobs
+have in common are a PBSJobTemplate, its attropl list is made once:
+
+    template = PBSJobTemplate({'Resource_List.walltime': '01:00:00', 'Job_Name': 'sim'}, 'batch')
+    result = bulk.submit_jobs(['run1.sh', ('run2.sh', {'Job_Name': 'sim2'})], template)
+    print result.jobids, result.stats()
+"""
+from __future__ import absolute_import
+
+import time
+
+from . import pbs
+from .PBSQuery import PBSConnectionPool, PBSError, connection_error
+
+
+def _attribute_list(new, attributes, op=None):
+    """
+    Convert a dictionary {attribute: value} to an attrl or attropl list made
+    by new(), a resource is given as 'attribute.resource', eg:
+    'Resource_List.walltime'
+    """
+    attribs = new(len(attributes))
+    i = 0
+    for name in sorted(attributes.keys()):
+        name_resource = name.split('.', 1)
+        attribs[i].name = name_resource[0]
+        if len(name_resource) == 2:
+            attribs[i].resource = name_resource[1]
+        attribs[i].value = str(attributes[name])
+        if op is not None:
+            attribs[i].op = op
+        i = i + 1
+    return attribs
+
+
+class PBSJobTemplate:
+    """
+    The attributes and destination queue that jobs have in common. The
+    attropl list for pbs_submit is made once and used for every job
+    without other attributes.
+    """
+
+    def __init__(self, attributes=None, destination='NULL'):
+        self.attributes = dict(attributes or {})
+        self.destination = destination
+        self._attropl = _attribute_list(pbs.new_attropl, self.attributes, pbs.SET)
+
+    def attropl(self, attributes=None):
+        """Return the attropl list, with attributes added to or replacing the template"""
+        if not attributes:
+            return self._attropl
+
+        merged = dict(self.attributes)
+        merged.update(attributes)
+        return _attribute_list(pbs.new_attropl, merged, pbs.SET)
+
+
+class PBSBulkResult:
+    """
+    The result of a bulk operation:
+      codes   : dictionary jobid: pbs error code, 0 is success
+      elapsed : seconds the operation took
+    """
+
+    def __init__(self, codes, elapsed):
+        self.codes = codes
+        self.elapsed = elapsed
+
+    def ok(self):
+        """Return the list of jobs that succeeded"""
+        return [j for j, code in self.codes.items() if not code]
+
+    def failed(self):
+        """Return a dictionary jobid: error code of the jobs that failed"""
+        return dict([(j, code) for j, code in self.codes.items() if code])
+
+    def throughput(self):
+        """Return the number of jobs per second"""
+        if not self.elapsed:
+            return float(len(self.codes))
+        return len(self.codes) / self.elapsed
+
+    def __repr__(self):
+        return '<PBSBulkResult %d jobs, %d failed, %.1f jobs/s>' %(len(self.codes), len(self.failed()), self.throughput())
+
+
+class PBSBulk:
+
+    def __init__(self, server=None, pool=None):
+        """
+        server : the pbs_server, default is pbs_default()
+        pool   : optional PBSConnectionPool to share, default a new pool
+        """
+        if not server:
+            server = pbs.pbs_default()
+        self.server = server
+
+        if not pool:
+            pool = PBSConnectionPool(server)
+        self.pool = pool
+
+    def close(self):
+        """Close the idle connections of the pool"""
+        self.pool.close()
+
+    def _call(self, func, jobid, args):
+        """
+        Call func(con, jobid, *args) on a pooled connection and return the
+        error code. The functions return the pbs error
+        code, some return -1 and set the error. A job error, eg:
+        PBSE_UNKJOBID, keeps the connection, it is not reused after a
+        connection error.
+        """
+        con = self.pool.acquire()
+        try:
+            rc = func(con, jobid, *args)
+        except:
+            self.pool.release(con, broken=True)
+            raise
+
+        if rc == -1:
+            rc = pbs.error()[0] or rc
+        self.pool.release(con, broken=connection_error(rc))
+        return rc
+
+    def _run(self, func, jobids, *args):
+        """Call func for all jobs and return a PBSBulkResult"""
+        start = time.time()
+        codes = {}
+        for jobid in jobids:
+            codes[jobid] = self._call(func, jobid, args)
+
+        return PBSBulkResult(codes, time.time() - start)
+
+    def delete_jobs(self, jobids, asynchronous=True):
+        if asynchronous:
+            extend = pbs.DELASYNC
+        else:
+            extend = 'NULL'
+        return self._run(pbs.pbs_deljob, jobids, extend)
+
+    def hold_jobs(self, jobids, hold_type='u'):
+        return self._run(pbs.pbs_holdjob, jobids, hold_type, 'NULL')
+
+    def release_jobs(self, jobids, hold_type='u'):
+        return self._run(pbs.pbs_rlsjob, jobids, hold_type, 'NULL')
+
+    def signal_jobs(self, jobids, signal, asynchronous=True):
+        if asynchronous:
+            return self._run(pbs.pbs_sigjobasync, jobids, signal, 'NULL')
+        return self._run(pbs.pbs_sigjob, jobids, signal, 'NULL')
+
+    def alter_jobs(self, jobids, attributes, asynchronous=True):
+        """
+        Set the attributes of all jobs, attributes is a dictionary, eg:
+            {'Resource_List.walltime': '48:00:00'}
+        The attrl list is made once and used for all jobs.
+        """
+        attribs = _attribute_list(pbs.new_attrl, attributes)
+        if asynchronous:
+            return self._run(pbs.pbs_alterjob_async, jobids, attribs, 'NULL')
+        return self._run(pbs.pbs_alterjob, jobids, attribs, 'NULL')
+
+    def run_jobs(self, jobids, location='NULL', asynchronous=True):
+        if asynchronous:
+            return self._run(pbs.pbs_asyrunjob, jobids, location, 'NULL')
+        return self._run(pbs.pbs_runjob, jobids, location, 'NULL')
+
+    def rerun_jobs(self, jobids):
+        return self._run(pbs.pbs_rerunjob, jobids, 'NULL')
+
+    def _submit(self, index, attropl, script, destination, retries, retry_delay, retry_errors):
+        """
+        Submit one job and return (index, jobid, error code, seconds,
+        retries). Failed connections and the error codes in
+        retry_errors are retried, the connection is only dropped after a
+        connection error. A connection error of pbs_submit, eg: on a stale
+        pooled connection, is retried once without delay on a new connection.
+        """
+        attempt = 0
+        reconnected = False
+        while True:
+            start = time.time()
+            try:
+                con = self.pool.acquire()
+            except PBSError:
+                code = -1
+                retry = True
+            else:
+                try:
+                    jobid = pbs.pbs_submit(con, attropl, script, destination, 'NULL')
+                except:
+                    self.pool.release(con, broken=True)
+                    raise
+
+                if jobid:
+                    self.pool.release(con)
+                    return index, jobid, 0, time.time() - start, attempt
+
+                code = pbs.error()[0] or -1
+                broken = connection_error(code)
+                self.pool.release(con, broken=broken)
+
+                if broken and not reconnected:
+                    reconnected = True
+                    attempt += 1
+                    continue
+                retry = code in retry_errors
+
+            if attempt - reconnected >= retries or not retry:
+                return index, None, code, time.time() - start, attempt
+
+            attempt += 1
+            time.sleep(retry_delay)
+
+    def submit_jobs(self, jobs, template=None, retries=2, retry_delay=1.0, retry_errors=()):
+        """
+        Submit jobs, a list of job scripts or (script, attributes) tuples,
+        with the attributes and destination of template. A job is retried
+        at most retries times, after retry_delay seconds, when there was
+        no connection or when pbs_submit failed with an error code in
+        retry_errors. A connection error of pbs_submit is retried once on
+        a new connection. Other errors are not retried, the job may have
+        been created. Returns a PBSSubmitResult.
+        """
+        if template is None:
+            template = PBSJobTemplate()
+        retry_errors = set(retry_errors)
+
+        start = time.time()
+        results = []
+        for index, j in enumerate(jobs):
+            if isinstance(j, tuple):
+                script, attributes = j
+            else:
+                script, attributes = j, None
+            results.append(self._submit(index, template.attropl(attributes), script, template.destination,
+                                        retries, retry_delay, retry_errors))
+
+        return PBSSubmitResult(results, time.time() - start)
+
+
+class PBSSubmitResult:
+    """
+    The result of submit_jobs(), in the order of the jobs:
+      jobids    : the job ids, None for a job that failed
+      codes     : the pbs error codes, 0 is success
+      latencies : seconds of the last pbs_submit of every job
+      retries   : the number of retries of every job
+      elapsed   : seconds submit_jobs() took
+    """
+
+    def __init__(self, results, elapsed):
+        self.jobids = [r[1] for r in results]
+        self.codes = [r[2] for r in results]
+        self.latencies = [r[3] for r in results]
+        self.retries = [r[4] for r in results]
+        self.elapsed = elapsed
+
+    def failed(self):
+        """Return a dictionary index: error code of the jobs that failed"""
+        return dict([(i, code) for i, code in enumerate(self.codes) if code])
+
+    def stats(self):
+        """Return the number of jobs, failures and retries, the submissions per second and latency statistics"""
+        latencies = sorted(self.latencies)
+        n = len(latencies)
+
+        stats = {
+            'submitted': n - len(self.failed()),
+            'failed': len(self.failed()),
+            'retries': sum(self.retries),
+            'throughput': n / self.elapsed if self.elapsed else float(n),
+        }
+        if latencies:
+            stats['min'] = latencies[0]
+            stats['mean'] = sum(latencies) / n
+            stats['p50'] = latencies[n // 2]
+            stats['p95'] = latencies[min(n - 1, int(n * 0.95))]
+            stats['max'] = latencies[-1]
+        return stats
+
+    def __repr__(self):
+        return '<PBSSubmitResult %d jobs, %d failed>' %(len(self.jobids), len(self.failed()))
@@ -0,0 +1,189 @@
+"""
+Usage: from pbs.PBSColumns import to_columns, to_numpy
+
+Convert the dictionaries of getnodes() and getjobs() into columns, one
+list (or NumPy array) per attribute, so totals and filters over all nodes
+or jobs can be computed on whole columns:
+
+    p = PBSQuery()
+    nodes = to_numpy(p.getnodes())
+    free = nodes['state'] == nodes.categories['state'].index('free')
+    print nodes['np'][free].sum(), nodes['availmem'][free].sum()
+
+The values are converted to the type of the column:
+  int, float : numbers
+  size       : memory sizes in bytes, eg: '6562224kb'
+  time       : walltime/cput in seconds, eg: '01:23:45'
+  code       : small integers, the values are in columns.categories[column]
+  str        : the value as it is
+
+NumPy is optional, it is only needed for to_numpy().
+"""
+from __future__ import absolute_import
+
+from collections import OrderedDict
+
+from .PBSQuery import PBSError, convert_size, convert_time, _PBSobject, job, node
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# (column, attribute, type), a resource is given as 'attribute.resource'
+#
+NODE_COLUMNS = [
+    ('state', 'state', 'code'),
+    ('np', 'np', 'int'),
+    ('ncpus', 'status.ncpus', 'int'),
+    ('physmem', 'status.physmem', 'size'),
+    ('availmem', 'status.availmem', 'size'),
+    ('totmem', 'status.totmem', 'size'),
+    ('loadave', 'status.loadave', 'float'),
+    ('nusers', 'status.nusers', 'int'),
+]
+
+JOB_COLUMNS = [
+    ('job_state', 'job_state', 'code'),
+    ('queue', 'queue', 'code'),
+    ('euser', 'euser', 'code'),
+    ('nodect', 'Resource_List.nodect', 'int'),
+    ('walltime', 'Resource_List.walltime', 'time'),
+    ('walltime_used', 'resources_used.walltime', 'time'),
+    ('cput_used', 'resources_used.cput', 'time'),
+    ('mem_used', 'resources_used.mem', 'size'),
+    ('ctime', 'ctime', 'int'),
+    ('start_time', 'start_time', 'int'),
+]
+
+CONVERTERS = {
+    'int'   : int,
+    'float' : float,
+    'size'  : convert_size,
+    'time'  : convert_time,
+    'str'   : str,
+}
+
+
+class Columns(OrderedDict):
+    """
+    Dictionary column: values, the first column is 'name'. categories is a
+    dictionary column: list of values, the code of a value is its index.
+    """
+
+    def __init__(self, *args, **kwargs):
+        OrderedDict.__init__(self, *args, **kwargs)
+        self.categories = {}
+
+
+def _default_columns(objects):
+    """Return the default columns for the kind of the first object"""
+    for obj in objects.values():
+        if isinstance(obj, node):
+            return NODE_COLUMNS
+        if isinstance(obj, job):
+            return JOB_COLUMNS
+        break
+    raise PBSError('No default columns for these objects, give the columns')
+
+
+def _get(obj, attribute):
+    """The first value of 'attribute' or 'attribute.resource', or None"""
+    if attribute in obj:
+        # also the old data structure
+        value = obj[attribute]
+    else:
+        name, dot, resource = attribute.partition('.')
+        value = obj.get(name)
+        if resource:
+            if isinstance(value, (dict, _PBSobject)):
+                value = value.get(resource)
+            else:
+                value = None
+
+    if isinstance(value, list):
+        if not value:
+            return None
+        value = value[0]
+    return value
+
+
+def to_columns(objects, columns=None):
+    """
+    Convert a dictionary of batch objects into a Columns dictionary of
+    lists. columns is a list of (column, attribute, type), default are
+    NODE_COLUMNS or JOB_COLUMNS. Missing values, or values that can not be
+    converted, are None. Values that are already converted by
+    PBSQuery.typed_data_structure() are used as they are.
+    """
+    if columns is None:
+        columns = _default_columns(objects)
+
+    names = sorted(objects.keys())
+    result = Columns()
+    result['name'] = names
+
+    for column, attribute, kind in columns:
+        values = []
+        if kind == 'code':
+            codes = {}
+            categories = []
+            for name in names:
+                value = _get(objects[name], attribute)
+                if value is None:
+                    values.append(None)
+                    continue
+
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(categories)
+                    categories.append(value)
+                values.append(code)
+
+            result.categories[column] = categories
+
+        else:
+            convert = CONVERTERS[kind]
+            for name in names:
+                value = _get(objects[name], attribute)
+                if isinstance(value, str):
+                    try:
+                        value = convert(value)
+                    except ValueError:
+                        value = None
+                values.append(value)
+
+        result[column] = values
+
+    return result
+
+
+def to_numpy(objects, columns=None):
+    """
+    Like to_columns(), but every column is a NumPy array:
+      - name and str columns are object arrays
+      - float columns are float64, missing values are nan
+      - int, size, time and code columns are int64, missing values are -1
+    """
+    if numpy is None:
+        raise ImportError('to_numpy() needs NumPy')
+
+    if columns is None:
+        columns = _default_columns(objects)
+
+    lists = to_columns(objects, columns)
+    result = Columns()
+    result.categories = lists.categories
+    result['name'] = numpy.array(lists['name'], dtype=object)
+
+    for column, attribute, kind in columns:
+        values = lists[column]
+        if kind == 'str':
+            result[column] = numpy.array(values, dtype=object)
+        elif kind == 'float':
+            result[column] = numpy.array([numpy.nan if v is None else v for v in values], dtype=numpy.float64)
+        else:
+            result[column] = numpy.array([-1 if v is None else v for v in values], dtype=numpy.int64)
+
+    return result
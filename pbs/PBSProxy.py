@@ -0,0 +1,337 @@
+"""
+Usage: python -m pbs.PBSProxy /run/pbs-proxy.sock [server]
+
+A local proxy for the pbs_stat*() queries of PBSQuery. Many programs that
+ask the same question at the same time, eg: getjob() of every job of a
+finished job array, cost one query of the pbs_server:
+  - identical requests that are in flight wait for the same answer
+  - answers are kept for ttl seconds
+  - the other requests use a small PBSConnectionPool
+
+PBSQuery uses the proxy when it is given or set in the environment, the
+get..() functions work as before:
+
+    p = PBSQuery('master', proxy='/run/pbs-proxy.sock')
+    export PBS_QUERY_PROXY=/run/pbs-proxy.sock
+
+A request names the pbs_server of the PBSQuery, the proxy refuses the
+requests for other servers. The PBSQuery then connects to its server
+itself, like it does when the socket can not be reached.
+
+All users of the socket share the answers of the user that runs the
+proxy, use the permissions of the socket to decide who may connect. Only
+the pbs_stat*() and select functions are forwarded.
+
+The protocol is one JSON object per line:
+    {"server": "master", "func": "pbs_statjob", "args": ["1.master", null, null]}
+    {"items": [["1.master", [["job_state", null, "R"], ...]]]}
+    {"error": "Could not make a connection with master"}
+    {"error": "The proxy serves master, not other", "unavailable": true}
+"""
+from __future__ import absolute_import, print_function
+
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+from . import pbs
+from .PBSQuery import PBSConnectionPool, PBSError, PBSProxyUnavailable
+from .PBSReplay import SELECT_FUNCTIONS, _Item, _arg_keys, _items, _native
+
+# The functions that are forwarded, the first argument of the select
+# functions is an attropl list
+#
+FUNCTIONS = ['pbs_statserver', 'pbs_statque', 'pbs_statnode', 'pbs_statjob'] + SELECT_FUNCTIONS
+
+
+def _swig_arg(arg, new):
+    """Convert an argument of a request back for the pbs function, see _arg_key()"""
+    if arg is None:
+        return 'NULL'
+    if not isinstance(arg, list):
+        return _native(arg)
+
+    attribs = new(len(arg))
+    for i, (name, resource, op, value) in enumerate(arg):
+        attribs[i].name = _native(name)
+        if resource:
+            attribs[i].resource = _native(resource)
+        if value is not None:
+            attribs[i].value = _native(value)
+        if op is not None:
+            attribs[i].op = op
+    return attribs
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode('utf-8'))
+                response = {'items': self.server.proxy.call(request['func'], request['args'],
+                                                            request.get('server'))}
+            except PBSProxyUnavailable as detail:
+                response = {'error': str(detail), 'unavailable': True}
+            except Exception as detail:
+                response = {'error': str(detail)}
+            self.wfile.write(json.dumps(response, separators=(',', ':')).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class PBSProxy:
+
+    def __init__(self, path, server=None, max_connections=4, ttl=2, pool=None):
+        """
+        path            : the unix socket
+        server          : the pbs_server, default is pbs_default()
+        max_connections : size of the connection pool
+        ttl             : seconds an answer is kept
+        pool            : optional PBSConnectionPool to use
+        """
+        if not server:
+            server = pbs.pbs_default()
+        self.server = server
+        self.path = path
+        self.ttl = ttl
+
+        if not pool:
+            pool = PBSConnectionPool(server, max_connections)
+        self.pool = pool
+
+        self.requests = 0
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.errors = 0
+
+        # key: (time, items), key: [event, items, error]
+        #
+        self._cache = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            os.unlink(path)
+        self._server = _Server(path, _Handler)
+        self._server.proxy = self
+
+    def _forward(self, func, args):
+        if func in SELECT_FUNCTIONS:
+            new = pbs.new_attropl
+        else:
+            new = pbs.new_attrl
+
+        args = [_swig_arg(a, new) for a in args]
+        l = self.pool.call(getattr(pbs, func), *args)
+        try:
+            return _items(l)
+        finally:
+            if func != 'pbs_selectjob':
+                pbs.pbs_statfree(l)
+
+    def call(self, func, args, server=None):
+        """
+        Return the items of func(*args) from the cache, an identical call or
+        the pbs_server. server is the pbs_server the client wants to query
+        """
+        if server and server != self.server:
+            raise PBSProxyUnavailable('The proxy serves %s, not %s' %(self.server, server))
+        if func not in FUNCTIONS:
+            raise PBSError('%s is not forwarded by the proxy' %(func))
+        key = json.dumps([func, args])
+
+        self._lock.acquire()
+        try:
+            self.requests += 1
+            entry = self._cache.get(key)
+            if entry and time.time() - entry[0] < self.ttl:
+                self.hits += 1
+                return entry[1]
+
+            inflight = self._inflight.get(key)
+            owner = inflight is None
+            if owner:
+                self.misses += 1
+                inflight = self._inflight[key] = [threading.Event(), None, None]
+            else:
+                self.coalesced += 1
+        finally:
+            self._lock.release()
+
+        if owner:
+            try:
+                inflight[1] = self._forward(func, args)
+            except Exception as detail:
+                inflight[2] = detail
+
+            self._lock.acquire()
+            try:
+                del self._inflight[key]
+                if inflight[2] is None:
+                    self._cache[key] = (time.time(), inflight[1])
+                    self._expire()
+                else:
+                    self.errors += 1
+            finally:
+                self._lock.release()
+            inflight[0].set()
+        else:
+            inflight[0].wait()
+
+        if inflight[2] is not None:
+            raise inflight[2]
+        return inflight[1]
+
+    def _expire(self):
+        """Drop the answers older than the ttl, called with the lock"""
+        limit = time.time() - self.ttl
+        for key, entry in list(self._cache.items()):
+            if entry[0] < limit:
+                del self._cache[key]
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def shutdown(self):
+        """Stop serve_forever(), from an other thread, and remove the socket"""
+        self._server.shutdown()
+        self._server.server_close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.pool.close()
+
+    def stats(self):
+        self._lock.acquire()
+        try:
+            return {
+                'requests': self.requests,
+                'hits': self.hits,
+                'coalesced': self.coalesced,
+                'misses': self.misses,
+                'errors': self.errors,
+                'cached': len(self._cache),
+            }
+        finally:
+            self._lock.release()
+
+
+class PBSProxyClient:
+    """Send the pbs_stat*() calls of a PBSQuery to a PBSProxy"""
+
+    def __init__(self, path, timeout=None, server=None):
+        """
+        path    : the unix socket of the PBSProxy
+        timeout : seconds to wait for the proxy, default is no timeout
+        server  : the pbs_server to query, the proxy refuses the requests
+                  when it serves an other one
+        """
+        self.path = path
+        self.timeout = timeout
+        self.server = server
+
+        self._socket = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.settimeout(self.timeout)
+        try:
+            s.connect(self.path)
+        except socket.error as detail:
+            s.close()
+            raise PBSProxyUnavailable('Could not make a connection with the proxy %s: %s\n' %(self.path, detail))
+        self._socket = s
+        self._file = s.makefile('rb')
+
+    def _request(self, line):
+        if self._socket is None:
+            self._connect()
+        self._socket.sendall(line)
+        response = self._file.readline()
+        if not response:
+            raise socket.error('connection closed')
+        return response
+
+    def call(self, func, *args):
+        """
+        Return the result of func(con, *args) from the proxy. Raises
+        PBSProxyUnavailable when the proxy does not answer in time or the
+        connection fails, also after one more try on a new connection.
+        """
+        name = getattr(func, '__name__', func)
+        request = {'server': self.server, 'func': name, 'args': _arg_keys(name, args)}
+        line = json.dumps(request).encode('utf-8') + b'\n'
+
+        self._lock.acquire()
+        try:
+            try:
+                try:
+                    response = self._request(line)
+                except socket.timeout:
+                    raise
+                except socket.error:
+                    # The proxy was restarted, try once more on a new connection
+                    #
+                    self.close()
+                    response = self._request(line)
+            except socket.error as detail:
+                self.close()
+                raise PBSProxyUnavailable('The proxy %s did not answer: %s\n' %(self.path, detail))
+        finally:
+            self._lock.release()
+
+        response = json.loads(response.decode('utf-8'))
+        if response.get('unavailable'):
+            raise PBSProxyUnavailable(_native(response['error']))
+        if 'error' in response:
+            raise PBSError(_native(response['error']))
+
+        result = []
+        for item in response['items']:
+            if isinstance(item, list):
+                result.append(_Item(item[0], item[1]))
+            else:
+                result.append(_native(item))
+        return result
+
+    def close(self):
+        if self._socket is not None:
+            self._file.close()
+            self._socket.close()
+        self._socket = None
+        self._file = None
+
+
+def main():
+    if len(sys.argv) < 2:
+        print('Usage: python -m pbs.PBSProxy socket [server]')
+        sys.exit(1)
+
+    server = None
+    if len(sys.argv) > 2:
+        server = sys.argv[2]
+
+    proxy = PBSProxy(sys.argv[1], server)
+    try:
+        proxy.serve_forever()
+    except KeyboardInterrupt:
+        proxy._server.server_close()
+        os.unlink(proxy.path)
+
+
+if __name__ == "__main__":
+    main()
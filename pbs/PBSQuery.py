@@ -25,19 +25,27 @@ are only interested in certain resources, see example
 There are the following functions for PBSQuery:
   job -
     getjob(job_id, attributes=<default is all>)
-    getjobs(attributes=<default is all>)
+    getjobs(attributes=<default is all>, select=<default is all jobs>)
+    select_jobs(criteria, attributes=<default is all>)
+    select_jobids(criteria)
+    iterjobs(attributes=<default is all>)
 
   node -
     getnode(node_id, attributes=<default is all>)
     getnodes(attributes=<default is all>)
+    iternodes(attributes=<default is all>)
 
   queue -
     getqueue(queue_id, attributes=<default is all>)
     getqueues(attributes=<default is all>)
+    iterqueues(attributes=<default is all>)
 
   server -
     get_serverinfo(attributes=<default is all>)
 
+  all -
+    getall(job attributes, node attributes, queue attributes)
+
 Here is an example how to use the module:
     from PBSQuery import PBSQuery
     p = PBSQuery()
@@ -57,13 +65,111 @@ you are interested in, eg: only show state of nodes
         l = list()
     l.append('state')
     nodes = p.getnodes(l)
+
+By default every query opens and closes its own connection with the
+pbs_server. For programs that poll the server frequently the connections
+can be kept open in a pool, bounded by pbs_query_max_connections():
+    p = PBSQuery(pool=True)
+    nodes = p.getnodes()
+    jobs = p.getjobs()
+    print p.pool.stats()
+
+A PBSConnectionPool instance can also be shared by several PBSQuery
+objects for the same server:
+    pool = PBSConnectionPool('master')
+    p1 = PBSQuery('master', pool=pool)
+    p2 = PBSQuery('master', pool=pool)
+
+When only a few attributes of many objects are used, the splitting of
+the values can be postponed until an attribute is accessed:
+    p = PBSQuery()
+    p.lazy_data_structure()
+    jobs = p.getjobs()
+    for name,job in jobs.items():
+        print name, job['job_state']
+
+Programs that call the get..() functions several times per second can
+share the results of identical queries for a few seconds:
+    p = PBSQuery()
+    p.enable_cache(ttl=10)
+    nodes = p.getnodes()      # query the pbs_server
+    nodes = p.getnodes()      # same dictionary, from the cache
+    p.invalidate('node')      # next getnodes() queries the pbs_server
+The returned dictionaries are shared, do not modify them.
+
+The values are strings, with typed_data_structure() sizes, times,
+numbers and booleans are converted to python types:
+    p.typed_data_structure()
+    jobs = p.getjobs()
+    print jobs['1.master']['Resource_List']['walltime']     # [ 86400 ]
+
+The iter..() functions return a generator that yields the objects one
+at a time instead of a dictionary, so only one parsed object is kept in
+memory. They are not cached:
+    for job in p.iterjobs(['job_state', 'euser']):
+        print job.name, job['euser']
+
+Jobs can be selected by the pbs_server (pbs_selstat), the criteria are a
+dictionary of attributes and values that must be equal or a list of
+(attribute, operator, value) tuples, operator is one of pbs.EQ, pbs.NE,
+pbs.GE, pbs.GT, pbs.LE or pbs.LT:
+    jobs = p.getjobs(select={'job_state': 'R', 'euser': 'bas', 'queue': 'long'})
+    jobs = p.select_jobs([('Resource_List.walltime', pbs.GT, '24:00:00')])
+
+A PBSQuery object can be used by several threads at the same time, but
+the pbs module keeps the GIL during the library calls, so the queries of
+the threads do not overlap. getall() returns the jobs, nodes and queues:
+    jobs, nodes, queues = p.getall(['job_state'], ['state', 'np'])
+
+PBSFederatedQuery queries several pbs_servers, default the servers of
+pbs_get_server_list(). The keys are 'name@server', servers that do not
+answer within the timeout are left out. The library calls hold the GIL, so
+the servers are queried one after the other and a hung server is not
+interrupted by the timeout:
+    f = PBSFederatedQuery(['master1', 'master2'], timeout=10)
+    jobs = f.getjobs(['job_state'])
+    for key,job in jobs.items():
+        name, server = f.split_key(key)
+    print f.stats()['master1']['latency']
+
+PBSWatcher reports the jobs and nodes that were added, removed or changed
+since the previous poll, with the names of the changed attributes:
+    w = PBSWatcher(PBSQuery(), ignore=['status'])
+    for change in w.watch(interval=30):
+        print change.kind, change.action, change.name, change.changed
+
+PBSIndex answers which jobs run on a node and which nodes and cores a
+job uses, without parsing the exec_host again for every lookup:
+    index = PBSIndex(p.getjobs(['exec_host']), p.getnodes(['state']))
+    print index.jobs_on('node24'), index.cores_of('446.master')
+    index.apply(w.poll())     # only reindex the changed jobs
+
+enable_instrumentation() records the count, latency histogram and the
+number of objects of every pbs_* call and the time spent parsing the
+results. Without it nothing is recorded:
+    stats = p.enable_instrumentation()
+    stats.add_hook(lambda name, seconds, objects, attributes, error: ...)
+    nodes = p.getnodes()
+    print stats.snapshot()['parse.node']
+
+With a PBSProxy running on the host the queries of many programs are
+combined and cached for a few seconds, see pbs.PBSProxy:
+    p = PBSQuery(proxy='/run/pbs-proxy.sock')    # or $PBS_QUERY_PROXY
+When the proxy is not running, or serves an other pbs_server, the
+PBSQuery object queries its pbs_server directly.
 """
-import pbs
-import UserDict
-import string
+from __future__ import absolute_import, print_function
+
+from . import pbs
+import bisect
+import functools
+import os
 import sys
 import re
-import types
+import threading
+import time
+
+from collections import OrderedDict
 
 
 REG_SUBRANGE = re.compile(r'^\d+(-\d+)?$')
@@ -83,13 +189,80 @@ True
 """
 REG_SPLIT_EQUAL_BRACE = re.compile(r'((:?[^=(]+(?:\(.*?\))?))(?:=|$)')
 
+_REG_SPLIT_BRACE = {
+    ',' : REG_SPLIT_COMMA_BRACE,
+    '=' : REG_SPLIT_EQUAL_BRACE,
+}
+
 JOB_RE = re.compile('(?:^|,)(?:((?:[\d,-]+)?\d+)/)?(.+)')
 
 
-def convert_range(rangetxt):
+def split_brace(value, sep):
+    """
+    Split value on sep (',' or '='), but not between (). Gives the same
+    result as REG_SPLIT_COMMA_BRACE and REG_SPLIT_EQUAL_BRACE in one pass
+    with str.split()/str.find(). A field that contains a '(' ends at the
+    first ')' that is followed by sep, eg: the jobs of a node status:
+
+    >>> split_brace('state=free,jobs=1.master(cput=1,mem=2kb) 2.master(cput=3),varattr=', ',')
+    ['state=free', 'jobs=1.master(cput=1,mem=2kb) 2.master(cput=3)', 'varattr=']
+    >>> split_brace('jobs=1.master(cput=1,mem=2kb) 2.master(cput=3)', '=')
+    ['jobs', '1.master(cput=1,mem=2kb) 2.master(cput=3)']
+    >>> split_brace('varattr=', '=')
+    ['varattr']
+
+    Values that the expressions handle in another way, eg: an unclosed
+    '(', are split with the expression.
+    """
+    if '(' not in value:
+        return [x for x in value.split(sep) if x]
+
+    if '\n' in value:
+        return [x[1] for x in _REG_SPLIT_BRACE[sep].findall(value)]
+
+    fields = []
+    close = ')' + sep
+    start = 0
+    end = len(value)
+    while start < end:
+        i = value.find(sep, start)
+        if i == -1:
+            i = end
+
+        j = value.find('(', start, i)
+        if j == -1:
+            if i > start:
+                fields.append(value[start:i])
+            start = i + 1
+            continue
+
+        if j == start:
+            return [x[1] for x in _REG_SPLIT_BRACE[sep].findall(value)]
+
+        # The field ends at the first ')' that is followed by sep
+        #
+        k = value.find(close, j)
+        if k == -1:
+            if value[-1] != ')':
+                return [x[1] for x in _REG_SPLIT_BRACE[sep].findall(value)]
+            k = end - 1
+
+        fields.append(value[start:k + 1])
+        start = k + 2
+
+    return fields
+
+
+def convert_range(rangetxt, compact=False):
     """
     Convert range string into list of id strings: eg.g '3,5,7-9' -> ['3','5','7','8','9']
+
+    With compact=True a RangeSet is returned, it only makes the strings
+    when it is iterated.
     """
+    if compact:
+        return RangeSet(rangetxt)
+
     ids=[]
     for subrange in [r.split('-') for r in rangetxt.split(',')]:
         start = int(subrange[0])
@@ -101,6 +274,377 @@ def convert_range(rangetxt):
     return ids
 
 
+SIZE_UNITS = {
+    '' : 1,
+    'k': 1024,
+    'm': 1024 ** 2,
+    'g': 1024 ** 3,
+    't': 1024 ** 4,
+    'p': 1024 ** 5,
+}
+
+TIME_UNITS = [1, 60, 3600, 86400]
+
+REG_SIZE = re.compile(r'^(\d+)([kmgtp]?)([bw]?)$', re.IGNORECASE)
+
+
+def convert_size(value):
+    """
+    Convert a pbs size string into bytes, eg: '6562224kb' -> 6719717376,
+    a 'w' (word) is 8 bytes. Returns None for a value that is not a size.
+    """
+    m = REG_SIZE.match(value.strip())
+    if not m:
+        return None
+
+    number, unit, word = m.groups()
+    size = int(number) * SIZE_UNITS[unit.lower()]
+    if word.lower() == 'w':
+        size *= 8
+    return size
+
+
+def convert_time(value):
+    """
+    Convert a pbs time string [[[DD:]HH:]MM:]SS into seconds, eg:
+    '01:23:45' -> 5025. Returns None for a value that is not a time.
+    """
+    parts = value.strip().split(':')
+    if len(parts) > 4:
+        return None
+
+    seconds = 0
+    for part, unit in zip(parts[::-1], TIME_UNITS):
+        if not part.isdigit():
+            return None
+        seconds += int(part) * unit
+    return seconds
+
+
+def convert_bool(value):
+    """Convert a pbs boolean string, eg: 'True' or 'false', raises ValueError"""
+    value = value.strip().lower()
+    if value in ('true', 't', 'yes', 'y', '1'):
+        return True
+    if value in ('false', 'f', 'no', 'n', '0'):
+        return False
+    raise ValueError('not a boolean: %s' %(value))
+
+
+class PBSTypes:
+    """
+    Converters of attribute values for PBSQuery.typed_data_structure().
+
+    The type of an attribute is looked up in TYPES by name, by
+    (name, resource) and by ('*', resource) for a resource of any
+    attribute, eg: ('*', 'walltime') for Resource_List and resources_used.
+    The node status values are (status, key). The lookup is done once per
+    attribute and the converted values are memoized, a value that occurs
+    in many objects (np=8, walltime=24:00:00) is converted only once.
+    Values that can not be converted are kept as they are.
+    """
+
+    CONVERTERS = {
+        'int'   : int,
+        'float' : float,
+        'bool'  : convert_bool,
+        'size'  : convert_size,
+        'time'  : convert_time,
+    }
+
+    TYPES = {
+        # jobs
+        'ctime'           : 'int',
+        'mtime'           : 'int',
+        'qtime'           : 'int',
+        'etime'           : 'int',
+        'start_time'      : 'int',
+        'comp_time'       : 'int',
+        'session_id'      : 'int',
+        'exit_status'     : 'int',
+        'Priority'        : 'int',
+        'start_count'     : 'int',
+        'job_radix'       : 'int',
+        'Rerunable'       : 'bool',
+        'fault_tolerant'  : 'bool',
+
+        # nodes
+        'np'              : 'int',
+        'gpus'            : 'int',
+        'mom_service_port': 'int',
+        'mom_manager_port': 'int',
+
+        # queues and server
+        'total_jobs'      : 'int',
+        'max_running'     : 'int',
+        'max_queuable'    : 'int',
+        'max_user_run'    : 'int',
+        'priority'        : 'int',
+        'enabled'         : 'bool',
+        'started'         : 'bool',
+        'scheduling'      : 'bool',
+        'query_other_jobs': 'bool',
+        'scheduler_iteration': 'int',
+        'node_check_rate' : 'int',
+        'tcp_timeout'     : 'int',
+        'keep_completed'  : 'int',
+
+        # resources
+        ('*', 'walltime') : 'time',
+        ('*', 'cput')     : 'time',
+        ('*', 'pcput')    : 'time',
+        ('*', 'mem')      : 'size',
+        ('*', 'vmem')     : 'size',
+        ('*', 'pmem')     : 'size',
+        ('*', 'pvmem')    : 'size',
+        ('*', 'file')     : 'size',
+        ('*', 'nodect')   : 'int',
+        ('*', 'ncpus')    : 'int',
+        ('*', 'energy_used'): 'int',
+
+        # node status
+        ('status', 'rectime')  : 'int',
+        ('status', 'ncpus')    : 'int',
+        ('status', 'physmem')  : 'size',
+        ('status', 'availmem') : 'size',
+        ('status', 'totmem')   : 'size',
+        ('status', 'loadave')  : 'float',
+        ('status', 'netload')  : 'int',
+        ('status', 'idletime') : 'int',
+        ('status', 'nusers')   : 'int',
+        ('status', 'nsessions'): 'int',
+    }
+
+    def __init__(self, types=None, max_memo=10000):
+        """
+        types    : optional dictionary to add to or override TYPES, a type
+                   is a key of CONVERTERS, a function or None
+        max_memo : the memoized values of a type are dropped when there
+                   are more
+        """
+        self.types = dict(self.TYPES)
+        if types:
+            self.types.update(types)
+        self.max_memo = max_memo
+
+        self._memos = {}
+        self._lookup = {}
+
+    def _memoize(self, kind):
+        """Return the memoizing converter of a type"""
+        if kind in self._memos:
+            return self._memos[kind]
+
+        if callable(kind):
+            func = kind
+        else:
+            func = self.CONVERTERS[kind]
+        memo = {}
+        max_memo = self.max_memo
+
+        def convert(value):
+            try:
+                return memo[value]
+            except KeyError:
+                pass
+
+            try:
+                result = func(value)
+            except ValueError:
+                result = None
+            if result is None:
+                result = value
+
+            if len(memo) >= max_memo:
+                memo.clear()
+            memo[value] = result
+            return result
+
+        self._memos[kind] = convert
+        return convert
+
+    def converter(self, name, resource=None):
+        """Return the converter of an attribute, None if it has no type"""
+        key = (name, resource)
+        try:
+            return self._lookup[key]
+        except KeyError:
+            pass
+
+        if resource is None:
+            kind = self.types.get(name)
+        else:
+            kind = self.types.get(key, self.types.get(('*', resource)))
+
+        if kind is None:
+            convert = None
+        else:
+            convert = self._memoize(kind)
+        self._lookup[key] = convert
+        return convert
+
+    def convert(self, name, resource, values):
+        """Convert a list of values of an attribute"""
+        convert = self.converter(name, resource)
+        if convert is None:
+            return values
+        return [convert(v) for v in values]
+
+
+class RangeSet(object):
+    """
+    A set of numbered ids stored as ranges, eg: the cores of a job
+    'node1/0-63' or the ids of a job array. The ids are strings made of a
+    prefix, a number and a suffix, they are only made on iteration:
+
+    >>> r = RangeSet('0-3,8', prefix='node1/')
+    >>> len(r), 'node1/2' in r, 'node1/5' in r
+    (5, True, False)
+    >>> list(r | RangeSet('9', prefix='node1/'))
+    ['node1/0', 'node1/1', 'node1/2', 'node1/3', 'node1/8', 'node1/9']
+    >>> str(r & RangeSet('2-9', prefix='node1/'))
+    'node1/2-3,8'
+
+    Every (prefix, suffix) group keeps a sorted list of disjoint
+    (first, last) ranges. The groups are iterated in the order they were
+    added, the numbers in a group in ascending order.
+    """
+    __slots__ = ('_groups',)
+
+    def __init__(self, rangetxt=None, prefix='', suffix=''):
+        self._groups = OrderedDict()
+        if rangetxt:
+            self.add_text(rangetxt, prefix, suffix)
+
+    def add(self, first, last=None, prefix='', suffix=''):
+        """Add the numbers first up to and including last"""
+        if last is None:
+            last = first
+        key = (prefix, suffix)
+        self._groups[key] = self._merge(self._groups.get(key, []) + [(first, last)])
+
+    def add_text(self, rangetxt, prefix='', suffix=''):
+        """Add a range string like convert_range() takes, eg: '3,5,7-9'"""
+        ranges = []
+        for subrange in rangetxt.split(','):
+            subrange = subrange.split('-')
+            first = int(subrange[0])
+            if len(subrange) == 2:
+                ranges.append((first, int(subrange[1])))
+            else:
+                ranges.append((first, first))
+
+        key = (prefix, suffix)
+        self._groups[key] = self._merge(self._groups.get(key, []) + ranges)
+
+    def _merge(self, ranges):
+        """Sort the ranges and join the ranges that overlap or touch"""
+        merged = []
+        for first, last in sorted(ranges):
+            if merged and first <= merged[-1][1] + 1:
+                if last > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], last)
+            else:
+                merged.append((first, last))
+        return merged
+
+    def _number(self, value):
+        """Return (key, number) of an id, or (None, None)"""
+        if isinstance(value, int):
+            return ('', ''), value
+
+        for prefix, suffix in self._groups:
+            if value.startswith(prefix) and value.endswith(suffix):
+                number = value[len(prefix):len(value) - len(suffix)]
+                if number.isdigit():
+                    return (prefix, suffix), int(number)
+        return None, None
+
+    def __contains__(self, value):
+        key, number = self._number(value)
+        ranges = self._groups.get(key)
+        if not ranges:
+            return False
+
+        i = bisect.bisect_right(ranges, (number, sys.maxsize)) - 1
+        return i >= 0 and ranges[i][0] <= number <= ranges[i][1]
+
+    def __len__(self):
+        return sum([last - first + 1 for ranges in self._groups.values() for first, last in ranges])
+
+    def __nonzero__(self):
+        return bool(self._groups)
+
+    __bool__ = __nonzero__
+
+    def __iter__(self):
+        for (prefix, suffix), ranges in self._groups.items():
+            for first, last in ranges:
+                for i in range(first, last + 1):
+                    yield '%s%d%s' %(prefix, i, suffix)
+
+    def ranges(self):
+        """Return a list of (prefix, suffix, first, last)"""
+        return [(prefix, suffix, first, last)
+                for (prefix, suffix), ranges in self._groups.items() for first, last in ranges]
+
+    def union(self, other):
+        new = RangeSet()
+        for groups in (self._groups, other._groups):
+            for key, ranges in groups.items():
+                new._groups[key] = new._merge(new._groups.get(key, []) + ranges)
+        return new
+
+    __or__ = union
+
+    def intersection(self, other):
+        new = RangeSet()
+        for key, ranges in self._groups.items():
+            others = other._groups.get(key)
+            if not others:
+                continue
+
+            common = []
+            i = j = 0
+            while i < len(ranges) and j < len(others):
+                first = max(ranges[i][0], others[j][0])
+                last = min(ranges[i][1], others[j][1])
+                if first <= last:
+                    common.append((first, last))
+                if ranges[i][1] < others[j][1]:
+                    i += 1
+                else:
+                    j += 1
+
+            if common:
+                new._groups[key] = common
+        return new
+
+    __and__ = intersection
+
+    def __eq__(self, other):
+        if not isinstance(other, RangeSet):
+            return NotImplemented
+        return dict(self._groups) == dict(other._groups)
+
+    def __ne__(self, other):
+        if not isinstance(other, RangeSet):
+            return NotImplemented
+        return not self == other
+
+    __hash__ = None
+
+    def __str__(self):
+        groups = []
+        for (prefix, suffix), ranges in self._groups.items():
+            text = ','.join([str(first) if first == last else '%d-%d' %(first, last) for first, last in ranges])
+            groups.append('%s%s%s' %(prefix, text, suffix))
+        return '+'.join(groups)
+
+    def __repr__(self):
+        return '<RangeSet %s>' %(self)
+
+
 class PBSError(Exception):
     def __init__(self, msg=''):
         self.msg = msg
@@ -112,55 +656,509 @@ class PBSError(Exception):
     __str__ = __repr__
 
 
+class PBSProxyUnavailable(PBSError):
+    """The PBSProxy can not be reached or does not serve the pbs_server"""
+    pass
+
+
+# The pbs error codes after which a connection can not be used again. A
+# failed read or write on the socket gives its errno, below PBSE_FLOOR.
+#
+PBSE_FLOOR = 15000
+PBSE_EXPIRED = 15022
+PBSE_PROTOCOL = 15033
+PBSE_NOCONNECTS = 15035
+PBSE_NOSERVER = 15036
+
+CONNECTION_ERRORS = frozenset([PBSE_EXPIRED, PBSE_PROTOCOL, PBSE_NOCONNECTS, PBSE_NOSERVER])
+
+
+def connection_error(code):
+    """True when the pbs error code means the connection is lost, eg: not PBSE_UNKJOBID"""
+    return code < 0 or 0 < code < PBSE_FLOOR or code in CONNECTION_ERRORS
+
+
+class PBSConnectionPool:
+    """
+    Keep connections with a pbs_server open between queries.
+
+    At most max_connections handles are handed out at the same time, the
+    default is pbs_query_max_connections(). Idle handles are reused, when
+    a call on a reused handle fails with a connection error the handle is
+    dropped and the call is retried once on a fresh connection.
+    """
+
+    def __init__(self, server, max_connections=None):
+        self.server = server
+        if not max_connections:
+            max_connections = pbs.pbs_query_max_connections()
+        self.max_connections = max_connections
+
+        self.hits = 0
+        self.misses = 0
+        self.reconnects = 0
+
+        self._idle = []
+        self._busy = 0
+        self._cond = threading.Condition()
+
+    def _open(self):
+        """Make a new connection with the pbs_server"""
+        con = pbs.pbs_connect(self.server)
+        if con < 0:
+            str = "Could not make a connection with %s\n" %(self.server)
+            raise PBSError(str)
+        return con
+
+    def acquire(self):
+        """Get an idle connection or open a new one, waits if the pool is exhausted"""
+        self._cond.acquire()
+        try:
+            while not self._idle and self._busy >= self.max_connections:
+                self._cond.wait()
+
+            self._busy += 1
+            if self._idle:
+                self.hits += 1
+                return self._idle.pop()
+            self.misses += 1
+        finally:
+            self._cond.release()
+
+        try:
+            return self._open()
+        except PBSError:
+            self.release(None)
+            raise
+
+    def release(self, con, broken=False):
+        """Give a connection back to the pool, broken connections are closed"""
+        if con is not None and broken:
+            pbs.pbs_disconnect(con)
+
+        self._cond.acquire()
+        try:
+            self._busy -= 1
+            if con is not None and not broken:
+                self._idle.append(con)
+            self._cond.notify()
+        finally:
+            self._cond.release()
+
+    def call(self, func, *args):
+        """
+        Call func(con, *args) on a pooled connection. The pbs_stat*()
+        functions return an empty list when they fail, then pbs.error() tells
+        us why. The reused handle may have gone stale (pbs_server restart,
+        idle timeout), so we retry once on a fresh connection. Other errors,
+        eg: an unknown job, are answers and the handle is kept.
+        """
+        con = self.acquire()
+        try:
+            result = func(con, *args)
+            if not result and connection_error(pbs.error()[0]):
+                pbs.pbs_disconnect(con)
+                con = None
+                con = self._open()
+
+                self._cond.acquire()
+                self.reconnects += 1
+                self._cond.release()
+
+                result = func(con, *args)
+        except:
+            self.release(con, broken=True)
+            raise
+
+        self.release(con)
+        return result
+
+    def close(self):
+        """Close all idle connections"""
+        self._cond.acquire()
+        try:
+            idle = self._idle
+            self._idle = []
+        finally:
+            self._cond.release()
+
+        for con in idle:
+            pbs.pbs_disconnect(con)
+
+    def stats(self):
+        """Return the hit/miss counters and the current pool usage"""
+        self._cond.acquire()
+        try:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'reconnects': self.reconnects,
+                'idle': len(self._idle),
+                'busy': self._busy,
+                'max_connections': self.max_connections,
+            }
+        finally:
+            self._cond.release()
+
+
+class PBSSnapshotCache:
+    """
+    Keep the dictionaries returned by PBSQuery for ttl seconds, the
+    least recently used entries are dropped when there are more than
+    max_entries. With stale_while_revalidate an expired entry is still
+    returned while it is refreshed in a background thread.
+
+    The keys are tuples: (server, object type, data structure, selection
+    and attribute list of the query).
+    """
+
+    def __init__(self, ttl=5, max_entries=64, stale_while_revalidate=False):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stale_while_revalidate = stale_while_revalidate
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, key, load):
+        """Return the cached value of key, load() is called when there is none"""
+        self._lock.acquire()
+        try:
+            entry = self._entries.pop(key, None)
+            if entry:
+                # Most recently used entries are at the end
+                #
+                self._entries[key] = entry
+
+                if time.time() - entry[0] < self.ttl:
+                    self.hits += 1
+                    return entry[1]
+
+                if self.stale_while_revalidate:
+                    self.stale += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        t = threading.Thread(target=self._refresh, args=(key, load))
+                        t.daemon = True
+                        t.start()
+                    return entry[1]
+
+            self.misses += 1
+        finally:
+            self._lock.release()
+
+        value = load()
+        self._store(key, value)
+        return value
+
+    def _store(self, key, value):
+        self._lock.acquire()
+        try:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time(), value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        finally:
+            self._lock.release()
+
+    def _refresh(self, key, load):
+        """Reload an expired entry, on errors the stale value is kept"""
+        try:
+            self._store(key, load())
+        except Exception:
+            pass
+
+        self._lock.acquire()
+        self._refreshing.discard(key)
+        self._lock.release()
+
+    def invalidate(self, kind=None):
+        """Drop all entries or only those of one object type, eg: 'job'"""
+        self._lock.acquire()
+        try:
+            if kind is None:
+                self._entries.clear()
+            else:
+                for key in list(self._entries.keys()):
+                    if key[1] == kind:
+                        del self._entries[key]
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        """Return the hit/miss counters and the number of entries"""
+        self._lock.acquire()
+        try:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+            }
+        finally:
+            self._lock.release()
+
+
+class PBSInstrument:
+    """
+    Count the pbs_* calls and the PBSQuery phases and record how long they
+    take. Every name has a call count, an error count, the total, minimum
+    and maximum seconds, a latency histogram and the number of objects and
+    attributes that were returned or parsed. The names are the pbs
+    functions, eg: 'pbs_statjob', 'pbs_connect', and 'parse.job' for
+    converting a pbs_statjob list into a dictionary of job objects.
+
+    Hooks are called as hook(name, seconds, objects, attributes, error)
+    after every record, eg: to send the numbers to a monitoring system.
+    """
+
+    # Upper bounds of the histogram buckets in seconds, the last is +inf
+    #
+    BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)
+
+    def __init__(self, buckets=None):
+        if buckets:
+            self.BUCKETS = tuple(sorted(buckets))
+
+        self._hooks = []
+        self._names = {}
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self._hooks.remove(hook)
+
+    def record(self, name, seconds, objects=0, attributes=0, error=False):
+        """Add one call of name that took seconds"""
+        self._lock.acquire()
+        try:
+            entry = self._names.get(name)
+            if not entry:
+                entry = self._names[name] = {
+                    'count': 0,
+                    'errors': 0,
+                    'total': 0.0,
+                    'min': seconds,
+                    'max': seconds,
+                    'objects': 0,
+                    'attributes': 0,
+                    'histogram': [0] * (len(self.BUCKETS) + 1),
+                }
+
+            entry['count'] += 1
+            entry['total'] += seconds
+            entry['min'] = min(entry['min'], seconds)
+            entry['max'] = max(entry['max'], seconds)
+            entry['objects'] += objects
+            entry['attributes'] += attributes
+            entry['histogram'][bisect.bisect_left(self.BUCKETS, seconds)] += 1
+            if error:
+                entry['errors'] += 1
+        finally:
+            self._lock.release()
+
+        for hook in self._hooks:
+            hook(name, seconds, objects, attributes, error)
+
+    def wrap(self, func, name=None):
+        """
+        Return a function that calls func and records the call, eg:
+            statjob = instrument.wrap(pbs.pbs_statjob)
+        A list result is counted as objects, an exception or an empty result
+        with a pbs error code as an error.
+        """
+        if name is None:
+            name = getattr(func, '__name__', str(func))
+
+        def call(*args):
+            start = time.time()
+            try:
+                result = func(*args)
+            except:
+                self.record(name, time.time() - start, error=True)
+                raise
+
+            seconds = time.time() - start
+            objects = 0
+            if isinstance(result, list):
+                objects = len(result)
+            error = not result and pbs.error()[0] != pbs.PBSE_NONE
+            self.record(name, seconds, objects, 0, error)
+            return result
+
+        call.__name__ = name
+        return call
+
+    def snapshot(self):
+        """
+        Return a dictionary name: statistics, the histogram is a list of
+        (upper bound, count), the last bound is None for +inf
+        """
+        bounds = list(self.BUCKETS) + [None]
+
+        self._lock.acquire()
+        try:
+            result = {}
+            for name, entry in self._names.items():
+                stats = dict(entry)
+                stats['mean'] = entry['total'] / entry['count']
+                stats['histogram'] = list(zip(bounds, entry['histogram']))
+                result[name] = stats
+            return result
+        finally:
+            self._lock.release()
+
+    def reset(self):
+        self._lock.acquire()
+        self._names.clear()
+        self._lock.release()
+
+
 class PBSQuery:
 
     # a[key] = value, key and value are data type string
     #
     OLD_DATA_STRUCTURE = False
 
-    def __init__(self, server=None):
+    # Only split values when they are accessed
+    #
+    LAZY_DATA_STRUCTURE = False
+
+    # PBSTypes object to convert the values, see typed_data_structure()
+    #
+    TYPES = None
+
+    # PBSInstrument object that records the calls, see enable_instrumentation()
+    #
+    INSTRUMENT = None
+
+    def __init__(self, server=None, pool=None, proxy=None):
+        """
+        server : the pbs_server to query, default is pbs_default()
+        pool   : optional, True to keep the connections open in a private
+                 PBSConnectionPool or a PBSConnectionPool to share
+        proxy  : optional, the unix socket of a PBSProxy to send the
+                 queries to, default is $PBS_QUERY_PROXY. It is not used
+                 when it can not be reached or serves an other server
+        """
         if not server:
             self.server = pbs.pbs_default()
         else:
             self.server = server
 
-        self._connect()
+        if pool is True:
+            self.pool = PBSConnectionPool(self.server)
+        else:
+            self.pool = pool
+
+        if proxy is None:
+            proxy = os.environ.get('PBS_QUERY_PROXY')
+        if proxy:
+            from .PBSProxy import PBSProxyClient
+            if not isinstance(proxy, PBSProxyClient):
+                proxy = PBSProxyClient(proxy, server=self.server)
+        self.proxy = proxy
+
+        self.cache = None
+
         ## this is needed for getjob a jobid is made off:
         #    sequence_number.server (is not self.server)
         #
         self.job_server_id = list(self.get_serverinfo())[0]
-        self._disconnect()
 
 
     def _connect(self):
         """Connect to the PBS/Torque server"""
-        self.con = pbs.pbs_connect(self.server)
-        if self.con < 0:
+        instrument = self.INSTRUMENT
+        if instrument:
+            start = time.time()
+            con = pbs.pbs_connect(self.server)
+            instrument.record('pbs_connect', time.time() - start, error=con < 0)
+        else:
+            con = pbs.pbs_connect(self.server)
+
+        if con < 0:
             str = "Could not make a connection with %s\n" %(self.server)
             raise PBSError(str)
+        return con
 
-    def _disconnect(self):
+    def _disconnect(self, con):
         """Close the PBS/Torque connection"""
-        pbs.pbs_disconnect(self.con)
-        self.attribs = 'NULL'
+        pbs.pbs_disconnect(con)
+
+    def _stat(self, func, *args):
+        """Call a pbs_stat*() function, on a pooled connection if we have a pool"""
+        instrument = self.INSTRUMENT
+        proxy = self.proxy
+        if proxy:
+            name = getattr(func, '__name__', str(func))
+            call = functools.partial(proxy.call, name)
+            if instrument:
+                call = instrument.wrap(call, name)
+            try:
+                return call(*args)
+            except PBSProxyUnavailable:
+                # Query the pbs_server directly from now on
+                #
+                self.proxy = None
+                proxy.close()
+
+        if instrument:
+            func = instrument.wrap(func)
+
+        if self.pool:
+            return self.pool.call(func, *args)
+
+        con = self._connect()
+        try:
+            return func(con, *args)
+        finally:
+            self._disconnect(con)
 
     def _list_2_attrib(self, list):
-        """Convert a python list to an attrib list suitable for pbs"""
-        self.attribs = pbs.new_attrl( len(list) )
+        """Convert a python list to an attrib list suitable for pbs, 'NULL' is all attributes"""
+        if not list:
+            return 'NULL'
+
+        attribs = pbs.new_attrl( len(list) )
         i = 0
         for attrib in list:
             # So we can user Resource
             attrib = attrib.split('.')
-            self.attribs[i].name = attrib[0]
+            attribs[i].name = attrib[0]
             i = i + 1
+        return attribs
+
+    def _criteria_2_attropl(self, criteria):
+        """Convert a list of (attribute, op, value) to an attropl list suitable for pbs"""
+        attropl = pbs.new_attropl( len(criteria) )
+        i = 0
+        for name, op, value in criteria:
+            # So we can select on Resource
+            name = name.split('.', 1)
+            attropl[i].name = name[0]
+            if len(name) == 2:
+                attropl[i].resource = name[1]
+            attropl[i].value = str(value)
+            attropl[i].op = op
+            i = i + 1
+        return attropl
 
     def _pbsstr_2_list(self, str, delimiter):
         """Convert a string to a python list and use delimiter as spit char"""
-        l = sting.splitfields(str, delimiter)
+        l = str.split(delimiter)
         if len(l) > 1:
             return l
 
-    def _list_2_dict(self, l, class_func):
+    def _list_2_dict(self, l, class_func, attrib_list=None):
         """
         Convert a pbsstat function list to a class dictionary, The
         data structure depends on the function new_data_structure().
@@ -180,195 +1178,165 @@ class PBSQuery:
 
                 print node['status']['arch']
                 >> [ 'x86_64' ]
-        """
-        self.d = {}
-        for item in l:
-            new = class_func()
-
-            self.d[item.name] = new
 
-            new.name = item.name
+        With lazy_data_structure() the values are stored as they are
+        returned by the pbs_server and only split the first time they
+        are accessed.
 
-            for a in item.attribs:
-
-                if self.OLD_DATA_STRUCTURE:
-
-                    if a.resource:
-                        key = '%s.%s' %(a.name, a.resource)
-                    else:
-                        key = '%s' %(a.name)
-
-                    new[key] = a.value
-                else:
-                    # Don't split , between ()
-                    values = [x[1] for x in REG_SPLIT_COMMA_BRACE.findall(a.value)]
-                    if len(values) == 1:
-                        values = [ a.value ]
-
-                    # We must creat sub dicts, only for specified
-                    # key values
-                    #
-                    if a.name in ['status', 'Variable_List']:
-
-                        for v in values:
-
-                            # Don't split between ()
-                            tmp_l = [x[1] for x in REG_SPLIT_EQUAL_BRACE.findall(v)]
+        When attrib_list is given the other attributes are skipped, for the
+        pbs functions that always return all attributes.
+        """
+        if attrib_list:
+            names = set([a.split('.')[0] for a in attrib_list])
+        else:
+            names = None
 
-                            ## Support for multiple EVENT mesages in format [key=value:]+
-                            #  format eg: message=EVENT:sample.time=1288864220.003,EVENT:kernel=upgrade,cputotals.user=0
-                            #             message=ERROR <text>
-                            #
-                            if tmp_l[0] in ['message']:
+        instrument = self.INSTRUMENT
+        if instrument:
+            start = time.time()
 
-                                if tmp_l[1].startswith('EVENT:'):
+        d = {}
+        for item in l:
+            d[item.name] = self._item_2_obj(item, class_func, names)
 
-                                    tmp_d  = dict()
-                                    new['event'] = class_func(tmp_d)
+        self._free(l)
 
-                                    message_list = v.split(':')
-                                    for event_type in message_list[1:]:
-                                        tmp_l = event_type.split('=')
-                                        new['event'][ tmp_l[0] ] = tmp_l[1:]
+        if instrument:
+            instrument.record('parse.%s' %(class_func.__name__), time.time() - start,
+                              len(d), sum([len(obj) for obj in d.values()]))
+        return d
 
-                                else:
+    def _item_2_obj(self, item, class_func, names=None):
+        """Convert one item of a pbsstat function list, see _list_2_dict()"""
+        new = class_func()
+        new.name = item.name
 
-                                    ## ERROR message
-                                    #
-                                    new['error'] = tmp_l [1:]
+        for a in item.attribs:
 
-                            elif tmp_l[0].startswith('EVENT:'):
+            if names and a.name not in names:
+                continue
 
-                                  message_list = v.split(':')
-                                  for event_type in message_list[1:]:
-                                      tmp_l = event_type.split('=')
-                                      new['event'][ tmp_l[0] ] = tmp_l[1:]
+            if self.OLD_DATA_STRUCTURE:
 
-                            else:
-                                  ## Check if we already added the key
-                                  #
-                                  if new.has_key(a.name):
+                if a.resource:
+                    key = '%s.%s' %(a.name, a.resource)
+                else:
+                    key = '%s' %(a.name)
 
-                                      new[a.name][ tmp_l[0] ] = tmp_l[1:]
+                new[key] = a.value
 
-                                  else:
+            elif self.LAZY_DATA_STRUCTURE:
+                new._add_raw(a.name, a.resource, a.value, self.TYPES)
 
-                                      tmp_d  = dict()
-                                      tmp_d[ tmp_l[0] ] = tmp_l[1:]
-                                      new[a.name] = class_func(tmp_d)
+            else:
+                new._add_attrib(a.name, a.resource, a.value, self.TYPES)
 
-                    else:
+        return new
 
-                        ## Check if it is a resource type variable, eg:
-                        #  - Resource_List.(nodes, walltime, ..)
-                        #
-                        if a.resource:
+    def _query(self, kind, stat, *args):
+        """
+        Call stat(*args), one of the _stat..() functions, and return the
+        dictionary. With enable_cache() the dictionary of an earlier
+        identical query is returned when it is younger than the ttl.
+        """
+        if not self.cache:
+            return stat(*args)
 
-                            if new.has_key(a.name):
-                                new[a.name][a.resource] = values
+        key = [self.server, kind, self.OLD_DATA_STRUCTURE, self.LAZY_DATA_STRUCTURE, self.TYPES]
+        for arg in args:
+            if isinstance(arg, list):
+                arg = tuple(arg)
+            key.append(arg)
 
-                            else:
-                                tmp_d = dict()
-                                tmp_d[a.resource] = values
-                                new[a.name] = class_func(tmp_d)
-                        else:
-                            # Simple value
-                            #
-                            new[a.name] = values
+        return self.cache.get(tuple(key), lambda: stat(*args))
 
-        self._free(l)
+    def _iter_stat(self, func, class_func, name, attrib_list):
+        """
+        Generator for the iter..() functions. The pbsstat function list is
+        freed when the generator is exhausted or closed.
+        """
+        attribs = self._list_2_attrib(attrib_list)
+        l = self._stat(func, name, attribs, 'NULL')
+        try:
+            for item in l:
+                yield self._item_2_obj(item, class_func)
+        finally:
+            self._free(l)
 
     def _free(self, memory):
         """
         freeing up used memmory
 
         """
+        if self.proxy:
+            # a python list made by the PBSProxyClient
+            return
         pbs.pbs_statfree(memory)
 
     def _statserver(self, attrib_list=None):
         """Get the server config from the pbs server"""
-        if attrib_list:
-            self._list_2_attrib(attrib_list)
-        else:
-            self.attribs = 'NULL'
-
-        self._connect()
-        serverinfo = pbs.pbs_statserver(self.con, self.attribs, 'NULL')
-        self._disconnect()
+        attribs = self._list_2_attrib(attrib_list)
+        serverinfo = self._stat(pbs.pbs_statserver, attribs, 'NULL')
 
-        self._list_2_dict(serverinfo, server)
+        return self._list_2_dict(serverinfo, server)
 
     def get_serverinfo(self, attrib_list=None):
-        self._statserver(attrib_list)
-        return self.d
+        return self._query('server', self._statserver, attrib_list)
 
     def _statqueue(self, queue_name='', attrib_list=None):
         """Get the queue config from the pbs server"""
-        if attrib_list:
-            self._list_2_attrib(attrib_list)
-        else:
-            self.attribs = 'NULL'
+        attribs = self._list_2_attrib(attrib_list)
+        queues = self._stat(pbs.pbs_statque, queue_name, attribs, 'NULL')
 
-        self._connect()
-        queues = pbs.pbs_statque(self.con, queue_name, self.attribs, 'NULL')
-        self._disconnect()
-
-        self._list_2_dict(queues, queue)
+        return self._list_2_dict(queues, queue)
 
     def getqueue(self, name, attrib_list=None):
-        self._statqueue(name, attrib_list)
+        d = self._query('queue', self._statqueue, name, attrib_list)
         try:
-            return self.d[name]
-        except KeyError, detail:
-            return self.d
+            return d[name]
+        except KeyError as detail:
+            return d
 
     def getqueues(self, attrib_list=None):
-        self._statqueue('', attrib_list)
-        return self.d
+        return self._query('queue', self._statqueue, '', attrib_list)
+
+    def iterqueues(self, attrib_list=None):
+        """Like getqueues(), but yields the queue objects one at a time"""
+        return self._iter_stat(pbs.pbs_statque, queue, '', attrib_list)
 
     def _statnode(self, select='', attrib_list=None, property=None):
         """Get the node config from the pbs server"""
-        if attrib_list:
-            self._list_2_attrib(attrib_list)
-        else:
-            self.attribs = 'NULL'
-
+        attribs = self._list_2_attrib(attrib_list)
         if property:
             select = ':%s' %(property)
 
-        self._connect()
-        nodes = pbs.pbs_statnode(self.con, select, self.attribs, 'NULL')
-        self._disconnect()
+        nodes = self._stat(pbs.pbs_statnode, select, attribs, 'NULL')
 
-        self._list_2_dict(nodes, node)
+        return self._list_2_dict(nodes, node)
 
     def getnode(self, name, attrib_list=None):
-        self._statnode(name, attrib_list)
+        d = self._query('node', self._statnode, name, attrib_list)
         try:
-            return self.d[name]
-        except KeyError, detail:
-            return self.d
+            return d[name]
+        except KeyError as detail:
+            return d
 
     def getnodes(self, attrib_list=None):
-        self._statnode('', attrib_list)
-        return self.d
+        return self._query('node', self._statnode, '', attrib_list)
 
     def getnodes_with_property(self, property, attrib_list=None):
-        self._statnode('', attrib_list, property)
-        return self.d
+        return self._query('node', self._statnode, '', attrib_list, property)
+
+    def iternodes(self, attrib_list=None):
+        """Like getnodes(), but yields the node objects one at a time"""
+        return self._iter_stat(pbs.pbs_statnode, node, '', attrib_list)
 
     def _statjob(self, job_name='', attrib_list=None):
         """Get the job config from the pbs server"""
-        if attrib_list:
-            self._list_2_attrib(attrib_list)
-        else:
-            self.attribs = 'NULL'
+        attribs = self._list_2_attrib(attrib_list)
+        jobs = self._stat(pbs.pbs_statjob, job_name, attribs, 'NULL')
 
-        self._connect()
-        jobs = pbs.pbs_statjob(self.con, job_name, self.attribs, 'NULL')
-        self._disconnect()
-
-        self._list_2_dict(jobs, job)
+        return self._list_2_dict(jobs, job)
 
     def getjob(self, name, attrib_list=None):
         ## To make sure we use the full name of a job; Changes a name
@@ -377,15 +1345,66 @@ class PBSQuery:
         if len(name.split('.')) == 1 :
             name = name.split('.')[0] + "." + self.job_server_id
 
-        self._statjob(name, attrib_list)
+        d = self._query('job', self._statjob, name, attrib_list)
         try:
-            return self.d[name]
-        except KeyError, detail:
-            return self.d
+            return d[name]
+        except KeyError as detail:
+            return d
 
-    def getjobs(self, attrib_list=None):
-        self._statjob('', attrib_list)
-        return self.d
+    def getjobs(self, attrib_list=None, select=None):
+        if select:
+            return self.select_jobs(select, attrib_list)
+        return self._query('job', self._statjob, '', attrib_list)
+
+    def _criteria(self, criteria):
+        """
+        The selection criteria as a tuple of (attribute, op, value), a
+        dictionary means all attributes must be equal
+        """
+        if isinstance(criteria, dict):
+            criteria = [(name, pbs.EQ, criteria[name]) for name in sorted(criteria.keys())]
+        return tuple([tuple(c) for c in criteria])
+
+    def _seljob(self, criteria, attrib_list=None):
+        """Get the jobs that match the criteria from the pbs server"""
+        attropl = self._criteria_2_attropl(criteria)
+        jobs = self._stat(pbs.pbs_selstat, attropl, 'NULL')
+
+        return self._list_2_dict(jobs, job, attrib_list)
+
+    def select_jobs(self, criteria, attrib_list=None):
+        """
+        Return the jobs that match criteria, the selection is done by the
+        pbs_server. criteria is a dictionary {attribute: value} for equal
+        values or a list of (attribute, op, value), eg:
+            [('job_state', pbs.EQ, 'R'), ('Resource_List.nodect', pbs.GE, 16)]
+        The pbs_server always returns all attributes of the selected jobs,
+        only those in attrib_list are converted.
+        """
+        return self._query('job', self._seljob, self._criteria(criteria), attrib_list)
+
+    def select_jobids(self, criteria):
+        """Return the ids of the jobs that match criteria, see select_jobs()"""
+        attropl = self._criteria_2_attropl(self._criteria(criteria))
+        ids = self._stat(pbs.pbs_selectjob, attropl, 'NULL')
+        if not ids:
+            return list()
+        return list(ids)
+
+    def iterjobs(self, attrib_list=None):
+        """
+        Like getjobs(), but yields the job objects one at a time. Use this
+        to process a large number of jobs with bounded memory.
+        """
+        return self._iter_stat(pbs.pbs_statjob, job, '', attrib_list)
+
+    def getall(self, job_attribs=None, node_attribs=None, queue_attribs=None):
+        """
+        Run getjobs(), getnodes() and getqueues() and return (jobs, nodes,
+        queues). The queries run one after the other, the pbs module does
+        not release the GIL so threads would only add overhead.
+        """
+        return (self.getjobs(job_attribs), self.getnodes(node_attribs), self.getqueues(queue_attribs))
 
     def get_server_name(self):
         return self.server
@@ -403,19 +1422,569 @@ class PBSQuery:
         """
         self.OLD_DATA_STRUCTURE = True
 
-class _PBSobject(UserDict.UserDict):
+    def lazy_data_structure(self, lazy=True):
+        """
+        Store the attribute values as returned by the pbs_server and
+        only split/decode a value the first time it is accessed. This
+        saves a lot of time when only a few attributes are used, eg:
+        the job_state of all jobs. Only for the new data structure.
+        """
+        self.LAZY_DATA_STRUCTURE = lazy
+
+    def typed_data_structure(self, types=True):
+        """
+        Convert the values of known attributes to python types: sizes to
+        bytes, walltime/cput to seconds, booleans, integers and timestamps
+        (seconds since the epoch), eg:
+            print job['resources_used']['mem']
+            >> [ 6719717376 ]
+
+        types is True for the default PBSTypes, a PBSTypes object or None
+        to switch the conversion off. Only for the new data structure.
+        """
+        if types is True:
+            types = PBSTypes()
+        self.TYPES = types
+
+    def enable_cache(self, ttl=5, max_entries=64, stale_while_revalidate=False):
+        """
+        Return the dictionary of an earlier identical get..() call when it
+        is younger than ttl seconds, see PBSSnapshotCache. The cache can be
+        shared with other PBSQuery objects: p2.cache = p1.cache
+        """
+        self.cache = PBSSnapshotCache(ttl, max_entries, stale_while_revalidate)
+        return self.cache
+
+    def disable_cache(self):
+        self.cache = None
+
+    def enable_instrumentation(self, instrument=None):
+        """
+        Record the pbs_* calls, the connects and the parse time of the
+        get..() functions in a PBSInstrument, a new one or instrument to
+        share it with other PBSQuery objects, eg:
+            stats = p.enable_instrumentation()
+            jobs = p.getjobs()
+            print stats.snapshot()['pbs_statjob']['mean']
+        """
+        if instrument is None:
+            instrument = PBSInstrument()
+        self.INSTRUMENT = instrument
+        return instrument
+
+    def disable_instrumentation(self):
+        self.INSTRUMENT = None
+
+    def invalidate(self, kind=None):
+        """
+        Drop cached results, kind is one of 'server', 'queue', 'node' or
+        'job', default is all
+        """
+        if self.cache:
+            self.cache.invalidate(kind)
+
+
+class PBSFederatedQuery:
+    """
+    Query several pbs_servers. Every server has its own PBSQuery object,
+    the get..() functions query all servers and merge the results. The keys
+    are qualified with the server name: 'name@server'.
+
+    A server that does not answer within timeout seconds, or fails, is left
+    out of the result and counted in stats().
+
+    Limits: the pbs module keeps the GIL during the library calls, so the
+    thread per server does not make the queries run in parallel, they take
+    as long as the sum of the servers. The timeout can not interrupt a
+    library call either: a get..() call returns only after a slow or hung
+    server answers or the connection times out, the timeout only decides
+    which answers are left out. The thread of a server that is still busy
+    finishes in the background.
+    """
+
+    def __init__(self, servers=None, timeout=None, pool=None):
+        """
+        servers : list of pbs_servers, default is pbs_get_server_list()
+        timeout : seconds to wait for the servers, default is no timeout
+        pool    : passed on to the PBSQuery object of each server
+        """
+        if not servers:
+            servers = [s for s in (pbs.pbs_get_server_list() or '').split(',') if s]
+        if not servers:
+            servers = [pbs.pbs_default()]
+
+        self.servers = []
+        for s in servers:
+            if s not in self.servers:
+                self.servers.append(s)
+
+        self.timeout = timeout
+        self.pool = pool
+
+        self._queries = {}
+        self._stats = dict([(s, {'calls': 0, 'errors': 0, 'timeouts': 0,
+                                 'latency': None, 'error': None}) for s in self.servers])
+        self._lock = threading.Lock()
+
+    def get_query(self, server):
+        """Return the PBSQuery object of server, it is made on first use"""
+        self._lock.acquire()
+        try:
+            p = self._queries.get(server)
+        finally:
+            self._lock.release()
+
+        if not p:
+            p = PBSQuery(server, pool=self.pool)
+            self._lock.acquire()
+            try:
+                p = self._queries.setdefault(server, p)
+            finally:
+                self._lock.release()
+        return p
+
+    def _call(self, server, method, args, results):
+        """Thread function, store the time and result of method(*args) for server"""
+        start = time.time()
+        try:
+            result = getattr(self.get_query(server), method)(*args)
+            results[server] = (time.time(), result)
+            error = None
+        except Exception as detail:
+            error = str(detail)
+
+        self._lock.acquire()
+        try:
+            s = self._stats[server]
+            s['latency'] = time.time() - start
+            if error:
+                s['errors'] += 1
+                s['error'] = error
+        finally:
+            self._lock.release()
+
+    def _fanout(self, method, *args):
+        """
+        Call method(*args) of the PBSQuery objects of all servers, a thread
+        per server, and return a dictionary with the result of each server that answered
+        in time. The time of an answer is checked too, a library call that
+        keeps the GIL past the timeout also blocks the joins
+        """
+        deadline = None
+        if self.timeout is not None:
+            deadline = time.time() + self.timeout
+
+        results = {}
+        threads = []
+        for server in self.servers:
+            t = threading.Thread(target=self._call, args=(server, method, args, results))
+            t.daemon = True
+            t.start()
+            threads.append((server, t))
+
+        for server, t in threads:
+            if self.timeout is None:
+                t.join()
+            else:
+                t.join(max(0, deadline - time.time()))
+
+        done = {}
+        self._lock.acquire()
+        try:
+            for server, t in threads:
+                self._stats[server]['calls'] += 1
+                answer = results.get(server)
+                if answer and (deadline is None or answer[0] <= deadline):
+                    done[server] = answer[1]
+                elif t.is_alive() or answer:
+                    self._stats[server]['timeouts'] += 1
+                    self._stats[server]['error'] = 'timeout after %s seconds' %(self.timeout)
+        finally:
+            self._lock.release()
+
+        return done
+
+    def _merge(self, method, *args):
+        """Merge the dictionaries of all servers with 'name@server' keys"""
+        d = {}
+        for server, objects in self._fanout(method, *args).items():
+            for name, obj in objects.items():
+                d['%s@%s' %(name, server)] = obj
+        return d
+
+    def get_serverinfo(self, attrib_list=None):
+        return self._merge('get_serverinfo', attrib_list)
+
+    def getqueues(self, attrib_list=None):
+        return self._merge('getqueues', attrib_list)
+
+    def getnodes(self, attrib_list=None):
+        return self._merge('getnodes', attrib_list)
+
+    def getjobs(self, attrib_list=None, select=None):
+        return self._merge('getjobs', attrib_list, select)
+
+    def split_key(self, key):
+        """Return (name, server) of a 'name@server' key"""
+        name, server = key.rsplit('@', 1)
+        return name, server
+
+    def stats(self):
+        """
+        Return per server: the number of calls, errors and timeouts, the
+        last error and the latency of the last answer in seconds
+        """
+        self._lock.acquire()
+        try:
+            return dict([(s, dict(v)) for s, v in self._stats.items()])
+        finally:
+            self._lock.release()
+
+
+class _Shape(object):
+    """
+    The attribute names of a batch object. A shape is shared by all objects
+    of a type that got the same attributes in the same order, an object only
+    keeps the list of values. Adding a name gives the next shape, these
+    transitions are remembered so the shapes are only made once.
+    """
+    __slots__ = ('keys', 'index', '_next')
+
+    def __init__(self, keys=()):
+        self.keys = keys
+        self.index = dict([(k, i) for i, k in enumerate(keys)])
+        self._next = {}
+
+    def add(self, key):
+        shape = self._next.get(key)
+        if shape is None:
+            shape = self._next[key] = _Shape(self.keys + (key,))
+        return shape
+
+
+class _PBSdict(dict):
+    """
+    The values of an attribute with resources or sub values, eg:
+    Resource_List, status and Variable_List. Their names vary from job to
+    job, so they are kept in a dictionary and not in a shared _Shape.
+    """
+    __slots__ = ()
+
+    def has_key(self, key):
+        return key in self
+
+    def get_value(self, key):
+        return self.get(key)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            error = 'Attribute key error: %s' %(name)
+            raise PBSError(error)
+
+
+class _PBSobject(object):
+    """
+    Dictionary like batch object, the attribute names are kept in a
+    _Shape shared with other objects of the same type. The values with
+    sub values are a _PBSdict.
+    """
+    __slots__ = ('name', '_shape', '_values', '_raw')
+
     TRUE  = 1
     FALSE = 0
 
+    # The empty shape, every type has its own
+    #
+    _root_shape = _Shape()
+
+    # Serializes the decoding of lazy values, see _decode()
+    #
+    _decode_lock = threading.Lock()
+
     def __init__(self, dictin = None):
-        UserDict.UserDict.__init__(self)
         self.name = None
+        self._shape = self._root_shape
+        self._values = []
+
+        # Undecoded attribute values, see PBSQuery.lazy_data_structure()
+        #   _raw[name] = [ (resource, value, types), ... ]
+        #
+        self._raw = None
 
         if dictin:
-            if dictin.has_key('name'):
+            if 'name' in dictin:
                 self.name = dictin['name']
                 del dictin['name']
-            self.data = dictin
+            for key, value in dictin.items():
+                self[key] = value
+
+    def _add_attrib(self, name, resource, value, types=None):
+        """
+        Add a pbs attribute value to the data structure, see
+        PBSQuery._list_2_dict(). types is the PBSTypes object of
+        PBSQuery.typed_data_structure()
+        """
+        # Don't split , between ()
+        values = split_brace(value, ',')
+        if len(values) == 1:
+            values = [ value ]
+
+        # We must creat sub dicts, only for specified
+        # key values
+        #
+        if name in ['status', 'Variable_List']:
+
+            for v in values:
+
+                # Don't split between ()
+                tmp_l = split_brace(v, '=')
+
+                ## Support for multiple EVENT mesages in format [key=value:]+
+                #  format eg: message=EVENT:sample.time=1288864220.003,EVENT:kernel=upgrade,cputotals.user=0
+                #             message=ERROR <text>
+                #
+                if tmp_l[0] in ['message']:
+
+                    if tmp_l[1].startswith('EVENT:'):
+
+                        tmp_d  = _PBSdict()
+                        self['event'] = tmp_d
+
+                        message_list = v.split(':')
+                        for event_type in message_list[1:]:
+                            tmp_l = event_type.split('=')
+                            self['event'][ tmp_l[0] ] = tmp_l[1:]
+
+                    else:
+
+                        ## ERROR message
+                        #
+                        self['error'] = tmp_l [1:]
+
+                elif tmp_l[0].startswith('EVENT:'):
+
+                      message_list = v.split(':')
+                      for event_type in message_list[1:]:
+                          tmp_l = event_type.split('=')
+                          self['event'][ tmp_l[0] ] = tmp_l[1:]
+
+                else:
+                      if types:
+                          tmp_l[1:] = types.convert(name, tmp_l[0], tmp_l[1:])
+
+                      ## Check if we already added the key
+                      #
+                      if self.has_key(name):
+
+                          self[name][ tmp_l[0] ] = tmp_l[1:]
+
+                      else:
+
+                          tmp_d  = _PBSdict()
+                          tmp_d[ tmp_l[0] ] = tmp_l[1:]
+                          self[name] = tmp_d
+
+        else:
+
+            if types:
+                values = types.convert(name, resource, values)
+
+            ## Check if it is a resource type variable, eg:
+            #  - Resource_List.(nodes, walltime, ..)
+            #
+            if resource:
+
+                if self.has_key(name):
+                    self[name][resource] = values
+
+                else:
+                    tmp_d = _PBSdict()
+                    tmp_d[resource] = values
+                    self[name] = tmp_d
+            else:
+                # Simple value
+                #
+                self[name] = values
+
+    def _add_raw(self, name, resource, value, types=None):
+        """Store a pbs attribute value, it is decoded when accessed"""
+        if self._raw is None:
+            self._raw = {}
+        self._raw.setdefault(name, []).append((resource, value, types))
+
+    def _decode(self, key):
+        """
+        Decode the stored values of key. Other threads may read the object
+        meanwhile, so the values are decoded on a copy. The object gets the
+        new values before the new shape and the stored values are removed
+        last, a reader never finds a name without its value.
+        """
+        names = [key]
+        if key in ['event', 'error']:
+            # These keys are made while decoding status messages
+            #
+            names.extend(['status', 'Variable_List'])
+
+        self._decode_lock.acquire()
+        try:
+            names = [name for name in names if self._raw and name in self._raw]
+            if not names:
+                return
+
+            decoded = self.__class__()
+            decoded._shape = self._shape
+            decoded._values = list(self._values)
+            for name in names:
+                for resource, value, types in self._raw[name]:
+                    decoded._add_attrib(name, resource, value, types)
+
+            self._values = decoded._values
+            self._shape = decoded._shape
+            for name in names:
+                del self._raw[name]
+        finally:
+            self._decode_lock.release()
+
+    def _decode_all(self):
+        """Decode all stored values"""
+        for key in list(self._raw.keys()):
+            self._decode(key)
+
+    def __getitem__(self, key):
+        if self._raw:
+            self._decode(key)
+        i = self._shape.index.get(key)
+        if i is None:
+            raise KeyError(key)
+        return self._values[i]
+
+    def __setitem__(self, key, item):
+        if self._raw and key in self._raw:
+            del self._raw[key]
+
+        i = self._shape.index.get(key)
+        if i is None:
+            self._values.append(item)
+            self._shape = self._shape.add(key)
+        else:
+            self._values[i] = item
+
+    def __delitem__(self, key):
+        if self._raw:
+            self._decode(key)
+        i = self._shape.index.get(key)
+        if i is None:
+            raise KeyError(key)
+
+        shape = self._root_shape
+        for k in self._shape.keys:
+            if k != key:
+                shape = shape.add(k)
+        self._shape = shape
+        del self._values[i]
+
+    def has_key(self, key):
+        if self._raw:
+            self._decode(key)
+        return key in self._shape.index
+
+    __contains__ = has_key
+
+    def keys(self):
+        if self._raw:
+            self._decode_all()
+        return list(self._shape.keys)
+
+    def values(self):
+        if self._raw:
+            self._decode_all()
+        return list(self._values)
+
+    def items(self):
+        if self._raw:
+            self._decode_all()
+        return list(zip(self._shape.keys, self._values))
+
+    def iterkeys(self):
+        return iter(self.keys())
+
+    def itervalues(self):
+        return iter(self.values())
+
+    def iteritems(self):
+        return iter(self.items())
+
+    __iter__ = iterkeys
+
+    def __len__(self):
+        if self._raw:
+            self._decode_all()
+        return len(self._values)
+
+    def __nonzero__(self):
+        if self._values or self._raw:
+            return True
+        else:
+            return False
+
+    __bool__ = __nonzero__
+
+    def __eq__(self, other):
+        if isinstance(other, _PBSobject):
+            other = other.data
+        return self.data == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def get(self, key, default=None):
+        if self.has_key(key):
+            return self[key]
+        else:
+            return default
+
+    def setdefault(self, key, default=None):
+        if not self.has_key(key):
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *default):
+        if self.has_key(key):
+            value = self[key]
+            del self[key]
+            return value
+        elif default:
+            return default[0]
+        raise KeyError(key)
+
+    def update(self, dictin=None, **kwargs):
+        if dictin:
+            for key in dictin.keys():
+                self[key] = dictin[key]
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def copy(self):
+        new = self.__class__()
+        new.name = self.name
+        new._shape = self._shape
+        new._values = list(self._values)
+        if self._raw:
+            new._raw = dict([(k, list(v)) for k, v in self._raw.items()])
+        return new
+
+    __copy__ = copy
+
+    @property
+    def data(self):
+        """The attributes as a dictionary, the objects used to be a UserDict"""
+        return dict(self.items())
 
     def get_value(self, key):
         if self.has_key(key):
@@ -432,23 +2001,16 @@ class _PBSobject(UserDict.UserDict):
     def __getattr__(self, name):
         """
         override the class attribute get method. Return the value
-        from the Userdict
+        from the dictionary
         """
+        if name.startswith('_'):
+            raise AttributeError(name)
         try:
-            return self.data[name]
+            return self[name]
         except KeyError:
             error = 'Attribute key error: %s' %(name)
             raise PBSError(error)
 
-    def __iter__(self):
-        return iter(self.data.keys())
-
-    def __nonzero__(self):
-        if self.data:
-            return True
-        else:
-            return False
-
     def uniq(self, list):
         """Filter out unique items of a list"""
         uniq_items = {}
@@ -458,13 +2020,16 @@ class _PBSobject(UserDict.UserDict):
 
     def return_value(self, key):
         """Function that returns a value independent of new or old data structure"""
-        if isinstance(self[key], types.ListType):
+        if isinstance(self[key], list):
             return self[key][0]
         else:
             return self[key]
 
 class job(_PBSobject):
     """PBS job class"""
+    __slots__ = ()
+    _root_shape = _Shape()
+
     def is_running(self):
 
         value = self.return_value('job_state')
@@ -473,19 +2038,23 @@ class job(_PBSobject):
         else:
             return self.FALSE
 
-    def get_nodes(self, unique=None):
+    def get_nodes(self, unique=None, compact=False):
         """
         Returns a list of the nodes which run this job
         format:
           * exec_host: gb-r10n14/5+gb-r10n14/4+gb-r10n14/3+gb-r10n14/2+gb-r10n14/1+gb-r10n14/0
           * split on '+' and if uniq is set split on '/'
+
+        With compact=True the 'node/core' ids are returned as a RangeSet
         """
         nodes = self.get_value('exec_host')
         if not nodes:
+            if compact and not unique:
+                return RangeSet()
             return list()
 
         if isinstance(nodes, str):
-            nodelist = string.split(nodes,'+')
+            nodelist = nodes.split('+')
         else:
             nodelist = []
             for n in nodes:
@@ -497,9 +2066,16 @@ class job(_PBSobject):
                 else:
                     nodelist.extend(n.split('+'))
 
+        if compact and not unique:
+            res = RangeSet()
+            for n in nodelist:
+                t = n.split('/')
+                res.add_text(t[1], prefix='%s/' % t[0])
+            return res
+
         res=[]
         for n in nodelist:
-            t = string.split(n,'/')
+            t = n.split('/')
 
             if not unique:
                 res.extend(["%s/%s" % (t[0],i) for i in convert_range(t[1])])
@@ -512,6 +2088,8 @@ class job(_PBSobject):
 
 class node(_PBSobject):
     """PBS node class"""
+    __slots__ = ()
+    _root_shape = _Shape()
 
     def is_free(self):
         """Check if node is free"""
@@ -527,14 +2105,20 @@ class node(_PBSobject):
         try:
             a = self['jobs']
             return self.TRUE
-        except KeyError, detail:
+        except KeyError as detail:
             return self.FALSE
 
-    def get_jobs(self, unique=None):
-        """Returns a list of the currently running job-id('s) on the node"""
+    def get_jobs(self, unique=None, compact=False):
+        """
+        Returns a list of the currently running job-id('s) on the node
+
+        With compact=True the 'core/job-id' ids are returned as a RangeSet
+        """
 
         jobs = self.get_value('jobs')
         if not jobs:
+            if compact and not unique:
+                return RangeSet()
             return list()
 
         if isinstance(jobs, str):
@@ -557,6 +2141,13 @@ class node(_PBSobject):
                 else:
                     joblist.append(j)
             
+            if compact and not unique:
+                res = RangeSet()
+                for j in joblist[::-1]:
+                    r=JOB_RE.search(j)
+                    res.add_text(r.groups()[0], suffix='/%s' % r.groups()[1])
+                return res
+
             # extend with nodes
             l = []
             
@@ -575,10 +2166,13 @@ class node(_PBSobject):
 
 class queue(_PBSobject):
     """PBS queue class"""
+    __slots__ = ()
+    _root_shape = _Shape()
+
     def is_enabled(self):
 
         value = self.return_value('enabled')
-        if value == 'True':
+        if value == 'True' or value is True:
             return self.TRUE
         else:
             return self.FALSE
@@ -593,38 +2187,293 @@ class queue(_PBSobject):
 
 class server(_PBSobject):
     """PBS server class"""
+    __slots__ = ()
+    _root_shape = _Shape()
 
     def get_version(self):
         return self.get_value('pbs_version')
 
+
+class PBSChange(object):
+    """
+    A change between two snapshots, see PBSWatcher:
+      kind    : 'job', 'node' or 'queue'
+      action  : 'added', 'removed' or 'changed'
+      name    : the id of the object
+      object  : the new object, the last known object when removed
+      changed : the names of the changed attributes, all attributes
+                when added or removed
+    """
+    __slots__ = ('kind', 'action', 'name', 'object', 'changed')
+
+    def __init__(self, kind, action, name, object, changed):
+        self.kind = kind
+        self.action = action
+        self.name = name
+        self.object = object
+        self.changed = changed
+
+    def __repr__(self):
+        return '<PBSChange %s %s %s %s>' %(self.kind, self.action, self.name, sorted(self.changed))
+
+
+class PBSWatcher:
+    """
+    Poll the pbs_server and report only what changed since the previous
+    poll. For every object the attribute values as returned by the
+    pbs_server and their hash are kept. Only the objects with other values
+    are converted to batch objects and compared attribute by attribute.
+
+    The current snapshot of each kind is kept in self.snapshot[kind], a
+    dictionary like getjobs() returns. Objects that did not change are the
+    same objects as in the previous snapshot, objects of which only ignored
+    attributes changed are replaced without reporting a change.
+    """
+
+    # kind: (pbs_stat function name, class)
+    #
+    KINDS = {
+        'job'   : ('pbs_statjob', job),
+        'node'  : ('pbs_statnode', node),
+        'queue' : ('pbs_statque', queue),
+    }
+
+    def __init__(self, query=None, kinds=('job', 'node'), attrib_list=None, ignore=None):
+        """
+        query       : the PBSQuery object to use, default PBSQuery()
+        kinds       : the kinds of objects to watch
+        attrib_list : optional dictionary kind: attributes to query
+        ignore      : attributes that do not count as a change, eg: the
+                      'status' of nodes changes every few seconds
+        """
+        if not query:
+            query = PBSQuery()
+        self.query = query
+
+        for kind in kinds:
+            if kind not in self.KINDS:
+                raise PBSError('Can not watch %s objects' %(kind))
+        self.kinds = tuple(kinds)
+        self.attrib_list = attrib_list or {}
+        self.ignore = set(ignore or [])
+
+        self.snapshot = dict([(kind, {}) for kind in self.kinds])
+        self._fingerprints = dict([(kind, {}) for kind in self.kinds])
+        self._listeners = []
+
+    def add_listener(self, func):
+        """func(change) is called for every change found by poll()"""
+        self._listeners.append(func)
+
+    def remove_listener(self, func):
+        self._listeners.remove(func)
+
+    def _diff(self, kind):
+        """Query the objects of kind and return the changes"""
+        func_name, class_func = self.KINDS[kind]
+        attribs = self.query._list_2_attrib(self.attrib_list.get(kind))
+
+        old_objects = self.snapshot[kind]
+        old_fingerprints = self._fingerprints[kind]
+        objects = {}
+        fingerprints = {}
+        changes = []
+
+        l = self.query._stat(getattr(pbs, func_name), '', attribs, 'NULL')
+        try:
+            for item in l:
+                name = item.name
+                values = tuple([(a.name, a.resource, a.value) for a in item.attribs])
+                fingerprint = hash(values)
+
+                old = old_fingerprints.get(name)
+                if old and old[0] == fingerprint and old[1] == values:
+                    objects[name] = old_objects[name]
+                    fingerprints[name] = old
+                    continue
+
+                obj = self.query._item_2_obj(item, class_func)
+                objects[name] = obj
+                fingerprints[name] = (fingerprint, values)
+
+                if old:
+                    changed = set([a[0] for a in set(values).symmetric_difference(old[1])]) - self.ignore
+                    if changed:
+                        changes.append(PBSChange(kind, 'changed', name, obj, changed))
+                else:
+                    changed = set([a[0] for a in values]) - self.ignore
+                    changes.append(PBSChange(kind, 'added', name, obj, changed))
+        finally:
+            self.query._free(l)
+
+        for name, old in old_fingerprints.items():
+            if name not in fingerprints:
+                changed = set([a[0] for a in old[1]]) - self.ignore
+                changes.append(PBSChange(kind, 'removed', name, old_objects[name], changed))
+
+        self.snapshot[kind] = objects
+        self._fingerprints[kind] = fingerprints
+        return changes
+
+    def poll(self):
+        """
+        Query the pbs_server and return the list of changes since the
+        previous poll. The first poll reports all objects as added.
+        """
+        changes = []
+        for kind in self.kinds:
+            changes.extend(self._diff(kind))
+
+        for change in changes:
+            for func in self._listeners:
+                func(change)
+        return changes
+
+    def watch(self, interval=10, count=None):
+        """
+        Generator that polls every interval seconds and yields the changes
+        one at a time, count is the number of polls, default forever
+        """
+        n = 0
+        while count is None or n < count:
+            if n:
+                time.sleep(interval)
+            n += 1
+
+            for change in self.poll():
+                yield change
+
+
+class PBSIndex:
+    """
+    Reverse indexes between the nodes and jobs of a snapshot, built from
+    the exec_host of the jobs:
+      jobs_on(node)   : set of the job ids that run on node
+      nodes_of(jobid) : list of the nodes of the job, in exec_host order
+      cores_of(jobid) : dictionary node: list of core numbers of the job
+
+    refresh() and apply() only reindex the jobs that changed. The returned
+    sets and dictionaries are shared, do not modify them.
+    """
+
+    def __init__(self, jobs=None, nodes=None):
+        """jobs and nodes are dictionaries like getjobs() and getnodes() return"""
+        self._jobs = {}
+        self._nodes = {}
+        self._job_cores = {}
+        self._node_jobs = {}
+        self.refresh(jobs, nodes)
+
+    def _add_job(self, name, obj):
+        cores = OrderedDict()
+        for prefix, suffix, first, last in obj.get_nodes(compact=True).ranges():
+            cores.setdefault(prefix[:-1], []).extend(range(first, last + 1))
+
+        self._jobs[name] = obj
+        self._job_cores[name] = cores
+        for host in cores:
+            self._node_jobs.setdefault(host, set()).add(name)
+
+    def _remove_job(self, name):
+        del self._jobs[name]
+        for host in self._job_cores.pop(name):
+            jobs = self._node_jobs[host]
+            jobs.discard(name)
+            if not jobs and host not in self._nodes:
+                del self._node_jobs[host]
+
+    def _add_node(self, name, obj):
+        self._nodes[name] = obj
+        self._node_jobs.setdefault(name, set())
+
+    def _remove_node(self, name):
+        del self._nodes[name]
+        if not self._node_jobs.get(name):
+            self._node_jobs.pop(name, None)
+
+    def refresh(self, jobs=None, nodes=None):
+        """
+        Update the index with a new snapshot of the jobs and/or nodes. Only
+        the jobs that are not the same object as in the previous snapshot
+        are reindexed, eg: with PBSWatcher.snapshot or a cached getjobs().
+        Returns the number of reindexed jobs.
+        """
+        if nodes is not None:
+            for name in [n for n in self._nodes if n not in nodes]:
+                self._remove_node(name)
+            for name, obj in nodes.items():
+                self._add_node(name, obj)
+
+        count = 0
+        if jobs is not None:
+            for name in [j for j in self._jobs if j not in jobs]:
+                self._remove_job(name)
+
+            for name, obj in jobs.items():
+                old = self._jobs.get(name)
+                if old is obj:
+                    continue
+                if old is not None:
+                    self._remove_job(name)
+                self._add_job(name, obj)
+                count += 1
+
+        return count
+
+    def apply(self, changes):
+        """Update the index with the PBSChange objects of PBSWatcher.poll()"""
+        for change in changes:
+            if change.kind == 'job':
+                if change.name in self._jobs:
+                    self._remove_job(change.name)
+                if change.action != 'removed':
+                    self._add_job(change.name, change.object)
+
+            elif change.kind == 'node':
+                if change.action == 'removed':
+                    if change.name in self._nodes:
+                        self._remove_node(change.name)
+                else:
+                    self._add_node(change.name, change.object)
+
+    def jobs_on(self, node):
+        return self._node_jobs.get(node, frozenset())
+
+    def nodes_of(self, jobid):
+        return list(self._job_cores.get(jobid, ()))
+
+    def cores_of(self, jobid):
+        return self._job_cores.get(jobid, {})
+
+
 def main():
     p = PBSQuery() 
     serverinfo = p.get_serverinfo()
     for server in serverinfo.keys():
-        print server, ' version: ', serverinfo[server].get_version()
+        print(server, ' version: ', serverinfo[server].get_version())
     for resource in serverinfo[server].keys():
-        print '\t ', resource, ' = ', serverinfo[server][resource]
+        print('\t ', resource, ' = ', serverinfo[server][resource])
 
     queues = p.getqueues()
     for queue in queues.keys():
-        print queue
+        print(queue)
         if queues[queue].is_execution():
-            print '\t ', queues[queue]
-        if queues[queue].has_key('acl_groups'):
-            print '\t acl_groups: yes'
+            print('\t ', queues[queue])
+        if 'acl_groups' in queues[queue]:
+            print('\t acl_groups: yes')
         else:
-            print '\t acl_groups: no'
+            print('\t acl_groups: no')
 
     jobs = p.getjobs()
     for name,job in jobs.items():
         if job.is_running():
-            print job
+            print(job)
 
     l = ['state']
     nodes = p.getnodes(l)
     for name,node in nodes.items():
         if node.is_free(): 
-            print node
+            print(node)
 
 if __name__ == "__main__":
     main()
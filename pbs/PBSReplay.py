@@ -0,0 +1,247 @@
+"""
+Usage: from pbs.PBSReplay import PBSRecordingQuery, PBSReplayQuery
+
+Record the answers of a pbs_server and replay them later without the
+server, eg: to profile the parsing of production data on a laptop.
+PBSRecordingQuery is a PBSQuery that writes the result of every
+pbs_stat*() call to a file:
+
+    p = PBSRecordingQuery('master', recorder='master.rec.gz')
+    jobs = p.getjobs()
+    nodes = p.getnodes()
+    p.recorder.close()
+
+PBSReplayQuery answers the same calls from the file, optionally with the
+recorded latency of the pbs_server or a fixed latency:
+
+    p = PBSReplayQuery('master.rec.gz', latency=0.5)
+    jobs = p.getjobs()
+
+A call with the same function and arguments that was recorded several
+times gets the answers in the recorded order, the last answer is
+repeated. The file is gzip compressed, one JSON record per line:
+    {"server": "master", "func": "pbs_statjob", "args": ["", null, null],
+     "seconds": 0.41, "items": [["1.master", [["job_state", null, "R"], ...]], ...]}
+"""
+from __future__ import absolute_import
+
+import gzip
+import json
+import sys
+import threading
+import time
+
+from .PBSQuery import PBSQuery, PBSError
+
+# The functions of which the attribute list is an attropl list, the
+# criteria of a selection
+#
+SELECT_FUNCTIONS = ['pbs_selstat', 'pbs_selectjob']
+
+
+def _arg_key(arg, attropl=False):
+    """
+    A JSON value for an argument of a pbs_stat*() function, 'NULL' is None.
+    attrl and attropl lists become lists of [name, resource, op, value].
+    new_attrl() does not initialize op and value, they are only used for
+    an attropl list.
+    """
+    if arg is None or arg == 'NULL':
+        return None
+    if isinstance(arg, (str, int, float)):
+        return arg
+
+    l = []
+    for a in arg:
+        if attropl:
+            l.append([a.name, getattr(a, 'resource', None), getattr(a, 'op', None), getattr(a, 'value', None)])
+        else:
+            l.append([a.name, getattr(a, 'resource', None), None, None])
+    return l
+
+
+def _arg_keys(func, args):
+    """The _arg_key() of all arguments of the pbs function named func"""
+    attropl = func in SELECT_FUNCTIONS
+    return [_arg_key(a, attropl) for a in args]
+
+
+def _items(result):
+    """A pbs_stat*() result as a list of [name, [[attribute, resource, value], ...]]"""
+    items = []
+    for item in result or []:
+        if isinstance(item, str):
+            # pbs_selectjob returns job ids
+            items.append(item)
+        else:
+            items.append([item.name, [[a.name, a.resource, a.value] for a in item.attribs]])
+    return items
+
+
+if sys.version_info[0] > 2:
+    def _native(value):
+        return value
+else:
+    def _native(value):
+        """json returns unicode, the SWIG wrapper str"""
+        if isinstance(value, unicode):
+            return value.encode('utf-8')
+        return value
+
+
+class _Attr(object):
+    __slots__ = ('name', 'resource', 'value')
+
+    def __init__(self, name, resource, value):
+        self.name = _native(name)
+        self.resource = _native(resource)
+        self.value = _native(value)
+
+
+class _Item(object):
+    __slots__ = ('name', 'attribs', 'text')
+
+    def __init__(self, name, attribs):
+        self.name = _native(name)
+        self.attribs = [_Attr(*a) for a in attribs]
+        self.text = None
+
+
+class PBSRecorder:
+    """Write pbs_stat*() results to a gzip compressed file of JSON records"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.records = 0
+
+        self._file = gzip.open(filename, 'wb')
+        self._lock = threading.Lock()
+
+    def record(self, server, func, args, result, seconds):
+        line = json.dumps({
+            'server': server,
+            'func': func,
+            'args': _arg_keys(func, args),
+            'seconds': seconds,
+            'items': _items(result),
+        }, separators=(',', ':'))
+
+        self._lock.acquire()
+        try:
+            self._file.write(line.encode('utf-8') + b'\n')
+            self.records += 1
+        finally:
+            self._lock.release()
+
+    def close(self):
+        self._lock.acquire()
+        try:
+            self._file.close()
+        finally:
+            self._lock.release()
+
+
+class PBSReplay:
+    """
+    The records of a PBSRecorder file. latency is the number of seconds
+    every call takes, 'recorded' for the latency of the recorded call.
+    """
+
+    def __init__(self, filename, latency=0):
+        self.filename = filename
+        self.latency = latency
+        self.server = None
+
+        self._answers = {}
+        self._next = {}
+        self._lock = threading.Lock()
+
+        f = gzip.open(filename, 'rb')
+        try:
+            for line in f:
+                record = json.loads(line.decode('utf-8'))
+                if self.server is None:
+                    self.server = _native(record['server'])
+                key = self._key(record['func'], record['args'])
+                self._answers.setdefault(key, []).append((record['seconds'], record['items']))
+        finally:
+            f.close()
+
+    def _key(self, func, args):
+        return json.dumps([func, args])
+
+    def call(self, func, *args):
+        """Return the recorded result of func(con, *args)"""
+        name = getattr(func, '__name__', func)
+        key = self._key(name, _arg_keys(name, args))
+
+        self._lock.acquire()
+        try:
+            answers = self._answers.get(key)
+            if not answers:
+                raise PBSError('No recorded answer for %s%s\n' %(name, tuple(args)))
+
+            i = self._next.get(key, 0)
+            self._next[key] = min(i + 1, len(answers) - 1)
+            seconds, items = answers[i]
+        finally:
+            self._lock.release()
+
+        if self.latency == 'recorded':
+            time.sleep(seconds)
+        elif self.latency:
+            time.sleep(self.latency)
+
+        result = []
+        for item in items:
+            if isinstance(item, list):
+                result.append(_Item(item[0], item[1]))
+            else:
+                result.append(_native(item))
+        return result
+
+    def rewind(self):
+        """Replay the answers from the start"""
+        self._lock.acquire()
+        self._next.clear()
+        self._lock.release()
+
+
+class PBSRecordingQuery(PBSQuery):
+    """PBSQuery that records the pbs_stat*() results, see PBSRecorder"""
+
+    def __init__(self, server=None, pool=None, recorder=None):
+        """
+        recorder : a PBSRecorder or the name of the file to write
+        """
+        if not isinstance(recorder, PBSRecorder):
+            recorder = PBSRecorder(recorder)
+        self.recorder = recorder
+        PBSQuery.__init__(self, server, pool)
+
+    def _stat(self, func, *args):
+        start = time.time()
+        result = PBSQuery._stat(self, func, *args)
+        self.recorder.record(self.server, getattr(func, '__name__', str(func)), args, result,
+                             time.time() - start)
+        return result
+
+
+class PBSReplayQuery(PBSQuery):
+    """PBSQuery that answers from a recorded file, see PBSReplay"""
+
+    def __init__(self, replay, latency=0):
+        """
+        replay  : a PBSReplay or the name of the file to replay
+        latency : seconds every call takes or 'recorded', see PBSReplay
+        """
+        if not isinstance(replay, PBSReplay):
+            replay = PBSReplay(replay, latency)
+        self.replay = replay
+        PBSQuery.__init__(self, replay.server)
+
+    def _stat(self, func, *args):
+        return self.replay.call(func, *args)
+
+    def _free(self, memory):
+        pass
@@ -0,0 +1,258 @@
+"""
+Usage: from pbs.PBSShared import PBSSnapshotPublisher, PBSSharedQuery
+
+Share one poll of the pbs_server with many programs on the same host. A
+publisher polls the server every interval seconds and writes the
+answers to a memory mapped file:
+
+    publisher = PBSSnapshotPublisher('/dev/shm/pbs-master.snap', PBSQuery('master'), interval=10)
+    publisher.run()
+
+Readers use PBSSharedQuery instead of PBSQuery. It returns the same job,
+node, queue and server objects, the data structure functions work as
+usual, but they are made from the last published snapshot and do not
+contact the pbs_server:
+
+    p = PBSSharedQuery('/dev/shm/pbs-master.snap')
+    jobs = p.getjobs(['job_state'])
+    print p.generation, p.age()
+
+The file starts with a header of a magic string, a generation counter,
+the length of the data and the time of the poll, followed by the zlib
+compressed JSON data. The publisher makes the generation odd while it
+writes, a reader that sees an odd or changed generation reads again. The
+file never shrinks, so the maps of the readers stay valid.
+
+The snapshot holds all attributes of the published objects, eg: the
+Variable_List of every job with the environment of its owner. The file
+is made readable for its owner only, give a mode (and a group) to share
+it with other users:
+
+    publisher = PBSSnapshotPublisher('/dev/shm/pbs-master.snap', mode=0o640)
+"""
+from __future__ import absolute_import
+
+import json
+import mmap
+import os
+import struct
+import time
+import zlib
+
+from . import pbs
+from .PBSQuery import PBSQuery, PBSError
+from .PBSReplay import _Item, _items, _native
+
+MAGIC = b'PBSSNAP1'
+HEADER = struct.Struct('<8sQQd')
+
+# pbs_stat*() function: snapshot key
+#
+KINDS = {
+    'pbs_statserver': 'server',
+    'pbs_statque': 'queue',
+    'pbs_statnode': 'node',
+    'pbs_statjob': 'job',
+}
+
+
+class PBSSnapshotPublisher:
+
+    def __init__(self, path, query=None, interval=10, kinds=('server', 'queue', 'node', 'job'), mode=0o600):
+        """
+        path     : the snapshot file, eg: in /dev/shm
+        query    : the PBSQuery that polls the server, default PBSQuery()
+        interval : seconds between the polls of run()
+        kinds    : the object types to publish
+        mode     : the permissions of a new snapshot file
+        """
+        if query is None:
+            query = PBSQuery()
+        self.path = path
+        self.query = query
+        self.interval = interval
+        self.kinds = kinds
+        self.generation = 0
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, mode)
+        try:
+            size = os.fstat(fd).st_size
+            if size < HEADER.size:
+                os.ftruncate(fd, HEADER.size)
+                size = HEADER.size
+            self._fd = fd
+            self._map = mmap.mmap(fd, size)
+        except:
+            os.close(fd)
+            raise
+
+        magic, generation, length, stamp = HEADER.unpack(self._map[:HEADER.size])
+        if magic == MAGIC:
+            # Continue the counter of the previous publisher, an odd value
+            # is a publisher that died while writing
+            #
+            self.generation = generation + (generation % 2)
+
+    def _poll(self):
+        """Return the raw pbs_stat*() answers of all kinds"""
+        funcs = dict([(kind, func) for func, kind in KINDS.items()])
+        snapshot = {'pbs_server': self.query.server}
+        for kind in self.kinds:
+            func = getattr(pbs, funcs[kind])
+            if kind == 'server':
+                l = self.query._stat(func, 'NULL', 'NULL')
+            else:
+                l = self.query._stat(func, '', 'NULL', 'NULL')
+            snapshot[kind] = _items(l)
+            self.query._free(l)
+        return snapshot
+
+    def publish(self):
+        """Poll the pbs_server, write the snapshot and return its generation"""
+        stamp = time.time()
+        data = zlib.compress(json.dumps(self._poll(), separators=(',', ':')).encode('utf-8'))
+
+        size = HEADER.size + len(data)
+        if size > len(self._map):
+            os.ftruncate(self._fd, size)
+            self._map.resize(size)
+
+        generation = self.generation
+        self._map[:HEADER.size] = HEADER.pack(MAGIC, generation + 1, 0, 0)
+        self._map[HEADER.size:size] = data
+        self._map[:HEADER.size] = HEADER.pack(MAGIC, generation + 2, len(data), stamp)
+        self._map.flush()
+
+        self.generation = generation + 2
+        return self.generation
+
+    def run(self, count=None):
+        """Publish every interval seconds, count times or forever"""
+        while True:
+            start = time.time()
+            try:
+                self.publish()
+            except PBSError:
+                # Keep the previous snapshot while the pbs_server is down
+                pass
+
+            if count is not None:
+                count -= 1
+                if count <= 0:
+                    break
+            time.sleep(max(0, self.interval - (time.time() - start)))
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+
+class PBSSnapshotReader:
+    """Read the snapshots of a PBSSnapshotPublisher, the data is decoded once per generation"""
+
+    def __init__(self, path, retries=100):
+        self.path = path
+        self.retries = retries
+        self.generation = 0
+        self.time = None
+        self.data = None
+
+        self._fd = os.open(path, os.O_RDONLY)
+        self._map = None
+
+    def _mapped(self, size):
+        if self._map is None or len(self._map) < size:
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._fd, os.fstat(self._fd).st_size, access=mmap.ACCESS_READ)
+        return self._map
+
+    def read(self):
+        """Return the data of the last snapshot, a dictionary kind: items"""
+        for attempt in range(self.retries):
+            m = self._mapped(HEADER.size)
+            magic, generation, length, stamp = HEADER.unpack(m[:HEADER.size])
+            if magic != MAGIC:
+                raise PBSError('%s is not a pbs snapshot\n' %(self.path))
+
+            if not generation:
+                raise PBSError('No snapshot is published in %s\n' %(self.path))
+
+            if generation == self.generation:
+                return self.data
+
+            if generation % 2:
+                # The publisher is writing
+                time.sleep(0.001)
+                continue
+
+            m = self._mapped(HEADER.size + length)
+            data = m[HEADER.size:HEADER.size + length]
+            if len(data) != length or HEADER.unpack(m[:HEADER.size])[1] != generation:
+                continue
+
+            self.data = json.loads(zlib.decompress(data).decode('utf-8'))
+            self.generation = generation
+            self.time = stamp
+            return self.data
+
+        raise PBSError('Could not read a consistent snapshot from %s\n' %(self.path))
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        os.close(self._fd)
+
+
+class PBSSharedQuery(PBSQuery):
+    """PBSQuery that answers from the snapshot of a PBSSnapshotPublisher"""
+
+    def __init__(self, path):
+        self.reader = PBSSnapshotReader(path)
+        PBSQuery.__init__(self, _native(self.reader.read()['pbs_server']))
+
+    @property
+    def generation(self):
+        return self.reader.generation
+
+    def age(self):
+        """Seconds since the pbs_server was polled for the snapshot"""
+        self.reader.read()
+        return time.time() - self.reader.time
+
+    def _stat(self, func, *args):
+        kind = KINDS.get(getattr(func, '__name__', None))
+        if not kind:
+            raise PBSError('%s is not in the snapshot\n' %(getattr(func, '__name__', func)))
+
+        items = self.reader.read().get(kind)
+        if items is None:
+            raise PBSError('The %s objects are not in the snapshot\n' %(kind))
+
+        if kind == 'server':
+            attribs = args[0]
+        else:
+            name, attribs = args[0], args[1]
+            if name.startswith(':'):
+                # getnodes_with_property()
+                #
+                property = name[1:]
+                items = [i for i in items
+                         if [a for a in i[1] if a[0] == 'properties' and property in a[2].split(',')]]
+            elif name:
+                items = [i for i in items if i[0] == name]
+
+        names = None
+        if attribs and attribs != 'NULL':
+            names = set([a.name for a in attribs])
+
+        result = []
+        for item in items:
+            attributes = item[1]
+            if names:
+                attributes = [a for a in attributes if a[0] in names]
+            result.append(_Item(item[0], attributes))
+        return result
+
+    def _free(self, memory):
+        pass
@@ -7,7 +7,26 @@
 
 
 from sys import version_info
-if version_info >= (2,6,0):
+if version_info >= (2,7,0):
+    def swig_import_helper():
+        import importlib
+        pkg = __name__.rpartition('.')[0]
+        mname = '.'.join((pkg, '_pbs')).lstrip('.')
+        try:
+            return importlib.import_module(mname)
+        except ImportError as detail:
+            # A top level _pbs only when there is no _pbs in the package,
+            # not when it fails to load, eg: without libtorque.so.2
+            if version_info >= (3,0,0):
+                missing = isinstance(detail, ModuleNotFoundError) and detail.name == mname
+            else:
+                missing = str(detail) == 'No module named _pbs'
+            if not missing:
+                raise
+            return importlib.import_module('_pbs')
+    _pbs = swig_import_helper()
+    del swig_import_helper
+elif version_info >= (2,6,0):
     def swig_import_helper():
         from os.path import dirname
         import imp
@@ -862,8 +881,6 @@ pbs_strerror = _pbs.pbs_strerror
 # $Date: 2002/10/21 14:14:47 $
 # $Revision: 1.6 $
 #
-import string
-import types
 
 # Default linux resources to get from the mom
 #
@@ -920,51 +937,51 @@ def check_resp(dict, str):
   
   ## Value can contain the '=' char :-(
   #  
-  l =  string.split(str, '=')
-  key = string.strip(l[0])
-  if len(l) > 2:
-    val = string.strip( '='.join(l[1:]) )
-  else:
-    val = string.strip(l[1])
+  l = str.split('=', 1)
+  if len(l) != 2:
+    return
 
-  key = string.strip(key)
-  val = string.strip(val)
+  key = l[0].strip()
+  val = l[1].strip()
 
   # Did we got a valid response
   #
-  if not val[0] == '?':
+  if val and not val[0] == '?':
     dict[key] = val
 
-def use_default_keywords(id, d):
+def batch_req(id, d, l):
   """
-  Get the default values from the mom daemon
+  Send all keywords of l before reading the responses, the mom answers
+  them in one round trip instead of one per keyword
   """
-  err = 0
-  for res in default_mom_res:
+  for res in l:
     addreq(id, res)
+
+  for res in l:
     resp = getreq(id)
     check_resp(d, resp)
 
+def use_default_keywords(id, d):
+  """
+  Get the default values from the mom daemon
+  """
+  batch_req(id, d, default_mom_res)
+
   # Do not proceed if we have an empty dictionary
   #
   if not d:
     return
 
   if d['arch' ] == 'linux':
-    for res in default_linux_res:
-      addreq(id, res)
-      resp = getreq(id)
-      check_resp(d, resp)
+    batch_req(id, d, default_linux_res)
 
 def use_user_keywords(id, d, l):
   for res in l:
-    if type(res) is types.StringType:
-      addreq(id, res)
-      resp = getreq(id)
-      check_resp(d, resp)
-    else:
+    if not isinstance(res, str):
         raise TypeError('Expected a string got %s :%s' %(type(res), res))
 
+  batch_req(id, d, l)
+
 def get_mom_values(id, list = None):
   """
   This function will query the mom with a default resmon keywords
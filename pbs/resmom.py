@@ -0,0 +1,312 @@
+"""
+Usage: from pbs.resmom import MomPoller
+
+Query the resource monitor (resmom) of many nodes. get_mom_values() of
+the pbs module queries one mom at a time, MomPoller keeps many mom
+connections open at the same time. The keywords of a node are sent in
+one batch and the answers are read from the first mom that responds:
+
+    poller = MomPoller(['loadave', 'availmem', 'physmem'], timeout=10)
+    for host, values, error in poller.poll(['node1', 'node2', 'node3']):
+        if error:
+            print host, error
+        else:
+            print host, values['loadave']
+
+The resmom functions of libtorque keep their connections in a global
+table and are not thread safe, so the nodes are polled from one thread:
+the requests to all nodes are sent first, activereq() returns the
+connection of a mom that answered.
+
+Programs that query the same moms again and again can keep the
+connections open in a MomConnectionCache, a broken connection is
+replaced by a new one the next time it is used:
+
+    cache = MomConnectionCache(idle_timeout=300)
+    values = cache.query('node1', ['loadave'])
+    poller = MomPoller(['loadave'], connections=cache)
+"""
+from __future__ import absolute_import
+
+import time
+
+from collections import deque, OrderedDict
+
+from . import pbs
+
+
+def parse_response(resp):
+    """
+    Split a mom response 'keyword=value' into (keyword, value), None when
+    there is no response or the keyword is unknown ('?' value). The value
+    can contain '=' characters. See pbs.check_resp().
+    """
+    d = {}
+    pbs.check_resp(d, resp)
+    if not d:
+        return None
+    return d.popitem()
+
+
+def _request(stream, keywords):
+    """Send the keywords, they are flushed by flushreq() or getreq()"""
+    for keyword in keywords:
+        if pbs.addreq(stream, keyword) != 0:
+            return False
+    return True
+
+
+def _response(stream, keywords):
+    """Read the answers of all keywords, None on a broken connection"""
+    values = {}
+    for keyword in keywords:
+        resp = pbs.getreq(stream)
+        if resp is None:
+            return None
+
+        kv = parse_response(resp)
+        if kv:
+            values[kv[0]] = kv[1]
+    return values
+
+
+class MomPoller:
+
+    def __init__(self, keywords=None, port=0, timeout=10, window=256, connections=None):
+        """
+        keywords    : the resmom keywords to query, default are the
+                      default_mom_res and default_linux_res of the pbs module
+        port        : the mom port, 0 is PBS_MOM_SERVICE_PORT
+        timeout     : seconds a node has to answer
+        window      : maximum number of open mom connections
+        connections : optional MomConnectionCache, the connections are kept
+                      open between polls
+        """
+        if not keywords:
+            keywords = pbs.default_mom_res + pbs.default_linux_res
+        self.keywords = list(keywords)
+        self.port = port
+        self.timeout = timeout
+        self.window = window
+        self.connections = connections
+
+    def _open(self, host):
+        """Return a mom connection of host, or -1"""
+        if self.connections:
+            return self.connections.get(host, self.port)
+        return pbs.openrm(host, self.port)
+
+    def _close(self, stream, broken=False):
+        if not self.connections:
+            pbs.closerm(stream)
+        elif broken:
+            self.connections.discard_stream(stream)
+
+    def poll(self, hosts):
+        """
+        Generator that yields (host, values, error) in the order the moms
+        answer. values is a dictionary keyword: value, None when error is
+        set, the error is a string.
+        """
+        pending = deque(hosts)
+        active = {}
+
+        while pending or active:
+
+            # Send the requests to the next nodes, then flush them together
+            #
+            opened = False
+            while pending and len(active) < self.window:
+                host = pending.popleft()
+                stream = self._open(host)
+                if stream < 0:
+                    yield host, None, 'can not connect to the mom'
+                    continue
+
+                ok = _request(stream, self.keywords)
+                if not ok and self.connections:
+                    # The mom may have closed a cached connection, try a new one
+                    #
+                    self._close(stream, broken=True)
+                    stream = self._open(host)
+                    ok = stream >= 0 and _request(stream, self.keywords)
+
+                if not ok:
+                    if stream >= 0:
+                        self._close(stream, broken=True)
+                    yield host, None, 'can not send the request'
+                    continue
+
+                active[stream] = (host, time.time() + self.timeout)
+                opened = True
+
+            if opened:
+                pbs.flushreq()
+
+            if not active:
+                continue
+
+            stream = pbs.activereq()
+            if stream in active:
+                host, deadline = active.pop(stream)
+                values = _response(stream, self.keywords)
+                if values is None:
+                    self._close(stream, broken=True)
+                    yield host, None, 'no response from the mom'
+                else:
+                    self._close(stream)
+                    yield host, values, None
+
+            elif stream >= 0:
+                # An answer on a connection that is not polled, eg: of a mom
+                # that timed out. Close it or activereq() keeps returning it
+                #
+                self._close(stream, broken=True)
+
+            else:
+                # No mom answered while activereq() waited
+                #
+                time.sleep(0.01)
+
+            now = time.time()
+            for stream, (host, deadline) in list(active.items()):
+                if deadline <= now:
+                    del active[stream]
+                    self._close(stream, broken=True)
+                    yield host, None, 'timeout after %s seconds' %(self.timeout)
+
+    def poll_all(self, hosts):
+        """Return a dictionary host: values, values is None when the node did not answer"""
+        return dict([(host, values) for host, values, error in self.poll(hosts)])
+
+
+class MomConnectionCache:
+    """
+    Keep resmom connections open, keyed by (host, port). A connection that
+    was not used for idle_timeout seconds is closed, when there are more
+    than max_connections the least recently used one is closed. Like the
+    resmom functions it must be used from one thread.
+
+    The error pointer arguments of closerm_err() and getreq_err() can not
+    be given from python, a connection is broken when addreq() fails or
+    getreq() returns nothing. It is closed and reopened the next time it
+    is needed.
+    """
+
+    def __init__(self, port=0, idle_timeout=300, max_connections=512):
+        """
+        port            : default mom port, 0 is PBS_MOM_SERVICE_PORT
+        idle_timeout    : seconds an unused connection is kept open
+        max_connections : maximum number of open connections
+        """
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self.max_connections = max_connections
+
+        self.hits = 0
+        self.misses = 0
+        self.broken = 0
+        self.evictions = 0
+
+        # (host, port): [stream, last used], least recently used first
+        #
+        self._connections = OrderedDict()
+        self._keys = {}
+
+    def _key(self, host, port):
+        if port is None:
+            port = self.port
+        return host, port
+
+    def _remove(self, key):
+        stream = self._connections.pop(key)[0]
+        del self._keys[stream]
+        pbs.closerm(stream)
+
+    def expire(self):
+        """Close the connections that were idle for more than idle_timeout seconds"""
+        limit = time.time() - self.idle_timeout
+        for key, (stream, used) in list(self._connections.items()):
+            if used >= limit:
+                break
+            self._remove(key)
+            self.evictions += 1
+
+    def get(self, host, port=None):
+        """Return an open connection with the mom of host, or -1"""
+        self.expire()
+
+        key = self._key(host, port)
+        if key in self._connections:
+            self.hits += 1
+            entry = self._connections.pop(key)
+            entry[1] = time.time()
+            self._connections[key] = entry
+            return entry[0]
+
+        self.misses += 1
+        stream = pbs.openrm(key[0], key[1])
+        if stream < 0:
+            return stream
+
+        while len(self._connections) >= self.max_connections:
+            self._remove(next(iter(self._connections)))
+            self.evictions += 1
+
+        self._connections[key] = [stream, time.time()]
+        self._keys[stream] = key
+        return stream
+
+    def discard(self, host, port=None):
+        """Close the connection of host, the next get() opens a new one"""
+        key = self._key(host, port)
+        if key in self._connections:
+            self._remove(key)
+            self.broken += 1
+
+    def discard_stream(self, stream):
+        """Like discard() for a connection returned by get()"""
+        key = self._keys.get(stream)
+        if key:
+            self._remove(key)
+            self.broken += 1
+        else:
+            pbs.closerm(stream)
+
+    def query(self, host, keywords, port=None):
+        """
+        Return a dictionary keyword: value of the mom of host, None when the
+        mom can not be reached. A cached connection that turns out to be
+        broken is replaced once.
+        """
+        for attempt in range(2):
+            reused = self._key(host, port) in self._connections
+            stream = self.get(host, port)
+            if stream < 0:
+                return None
+
+            values = None
+            if _request(stream, keywords):
+                values = _response(stream, keywords)
+            if values is not None:
+                return values
+
+            self.discard_stream(stream)
+            if not reused:
+                return None
+
+        return None
+
+    def close(self):
+        """Close all connections"""
+        for key in list(self._connections.keys()):
+            self._remove(key)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'broken': self.broken,
+            'evictions': self.evictions,
+            'open': len(self._connections),
+        }
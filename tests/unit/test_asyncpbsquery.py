@@ -0,0 +1,105 @@
+import multiprocessing
+import sys
+import unittest
+
+from pbs import PBSQuery
+
+if sys.version_info[0] > 2:
+    import asyncio
+    from pbs import AsyncPBSQuery
+
+try:
+    from .test_pbsquery import _FakeServer, _Item
+except (ImportError, ValueError):
+    from test_pbsquery import _FakeServer, _Item
+
+
+@unittest.skipIf(sys.version_info[0] == 2, 'asyncio is Python 3 only')
+class TestAsyncPBSQueryUnit(unittest.TestCase):
+    """The worker processes are forked, they get the fake server of the test"""
+
+    def setUp(self):
+        self.server = _FakeServer(PBSQuery.pbs)
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+        self.loop.close()
+        self.server.restore()
+
+    def test_getjobs(self):
+        self.server.jobs = [_Item('1.master', [('job_state', 'R')])]
+        self.server.nodes = [_Item('node1', [('state', 'free')])]
+        p = AsyncPBSQuery.AsyncPBSQuery('master', max_concurrency=2)
+        jobs, nodes = self.loop.run_until_complete(asyncio.gather(p.getjobs(), p.getnodes(['state'])))
+        p.close()
+        self.assertEqual(list(jobs.keys()), ['1.master'])
+        self.assertEqual(jobs['1.master'].job_state, ['R'])
+        self.assertEqual(nodes['node1']['state'], ['free'])
+
+    def test_semaphore_per_loop(self):
+        self.server.jobs = [_Item('1.master', [('job_state', 'R')])]
+        p = AsyncPBSQuery.AsyncPBSQuery('master', max_concurrency=1)
+        try:
+            for i in range(2):
+                if i:
+                    asyncio.set_event_loop(None)
+                    self.loop.close()
+                    self.loop = asyncio.new_event_loop()
+                    asyncio.set_event_loop(self.loop)
+                results = self.loop.run_until_complete(asyncio.gather(p.getjobs(), p.getjobs()))
+                self.assertEqual([list(r.keys()) for r in results], [['1.master'], ['1.master']])
+        finally:
+            p.close()
+
+    def test_concurrency_limit_and_timeout(self):
+        running = multiprocessing.Value('i', 0)
+        busy = multiprocessing.Value('i', 0)
+        calls = multiprocessing.Value('i', 0)
+        release = multiprocessing.Event()
+
+        def deljob(con, jobid, extend):
+            with running.get_lock():
+                running.value += 1
+                calls.value += 1
+                busy.value = max(busy.value, running.value)
+            release.wait(5)
+            with running.get_lock():
+                running.value -= 1
+            return 15001
+
+        PBSQuery.pbs.pbs_deljob = deljob
+        p = AsyncPBSQuery.AsyncPBSQuery('master', max_concurrency=2, timeout=0.5)
+        try:
+            self.assertRaises(asyncio.TimeoutError, self.loop.run_until_complete,
+                              p.deljobs(['%d.master' % i for i in range(5)]))
+            self.assertEqual((calls.value, busy.value), (2, 2))
+
+            release.set()
+            p.timeout = None
+            codes = self.loop.run_until_complete(p.deljobs(['1.master', '2.master']))
+            self.assertEqual(codes, {'1.master': 15001, '2.master': 15001})
+            self.assertEqual((calls.value, busy.value), (4, 2))
+        finally:
+            release.set()
+            p.close()
+
+    def test_jobcall_once(self):
+        calls = multiprocessing.Value('i', 0)
+
+        def deljob(con, jobid, extend):
+            with calls.get_lock():
+                calls.value += 1
+            return 0
+
+        PBSQuery.pbs.pbs_deljob = deljob
+        self.server.errno = 15033
+
+        p = AsyncPBSQuery.AsyncPBSQuery('master', max_concurrency=2)
+        try:
+            codes = self.loop.run_until_complete(p.deljobs(['1.master', '2.master']))
+        finally:
+            p.close()
+        self.assertEqual(codes, {'1.master': 0, '2.master': 0})
+        self.assertEqual(calls.value, 2)
@@ -0,0 +1,91 @@
+import unittest
+
+from pbs import PBSBulk, PBSQuery
+
+try:
+    from .test_pbsquery import _Attr, _FakeServer
+except (ImportError, ValueError):
+    from test_pbsquery import _Attr, _FakeServer
+
+
+class TestPBSBulkUnit(unittest.TestCase):
+    def setUp(self):
+        self.server = _FakeServer(PBSQuery.pbs)
+
+    def tearDown(self):
+        self.server.restore()
+
+    def test_bulk_jobs(self):
+        calls = []
+
+        def deljob(con, jobid, extend):
+            calls.append((con, jobid, extend))
+            if jobid == '2.master':
+                return 15001
+            return 0
+
+        PBSQuery.pbs.pbs_deljob = deljob
+        bulk = PBSBulk.PBSBulk('master', pool=PBSQuery.PBSConnectionPool('master', 2))
+        result = bulk.delete_jobs(['%d.master' % i for i in range(10)])
+        self.assertEqual(sorted(result.ok()), sorted(['%d.master' % i for i in range(10) if i != 2]))
+        self.assertEqual(result.failed(), {'2.master': 15001})
+        self.assertTrue(result.throughput() > 0)
+        self.assertEqual(set([c[2] for c in calls]), set([PBSQuery.pbs.DELASYNC]))
+        self.assertEqual(self.server.connects, 1)
+        self.assertEqual(self.server.disconnects, 0)
+        self.assertEqual(bulk.pool.stats()['busy'], 0)
+
+        altered = []
+        PBSQuery.pbs.new_attrl = lambda n: [_Attr(None, None) for i in range(n)]
+        PBSQuery.pbs.pbs_alterjob_async = lambda con, jobid, attribs, extend: altered.append((jobid, attribs)) or 0
+        result = bulk.alter_jobs(['1.master', '3.master'], {'Resource_List.walltime': '48:00:00'})
+        self.assertEqual(result.failed(), {})
+        self.assertTrue(altered[0][1] is altered[1][1])
+        attrib = altered[0][1][0]
+        self.assertEqual((attrib.name, attrib.resource, attrib.value), ('Resource_List', 'walltime', '48:00:00'))
+
+        bulk.close()
+        self.assertEqual(self.server.disconnects, self.server.connects)
+
+    def test_bulk_submit(self):
+        submitted = []
+        busy = set()
+
+        def submit(con, attropl, script, destination, extend):
+            if script == 'busy.sh' and script not in busy:
+                busy.add(script)
+                self.server.errno = 15029
+                return None
+            if script == 'stale.sh' and script not in busy:
+                busy.add(script)
+                self.server.errno = 15033
+                return None
+            if script == 'bad.sh':
+                self.server.errno = 15025
+                return None
+            submitted.append((script, attropl, destination))
+            return '%d.master' % len(submitted)
+
+        PBSQuery.pbs.pbs_submit = submit
+        bulk = PBSBulk.PBSBulk('master', pool=PBSQuery.PBSConnectionPool('master', 2))
+        template = PBSBulk.PBSJobTemplate({'Resource_List.walltime': '01:00:00', 'Job_Name': 'sim'}, 'batch')
+        result = bulk.submit_jobs(['a.sh', ('b.sh', {'Job_Name': 'other'}), 'busy.sh', 'bad.sh', 'c.sh', 'stale.sh'],
+                                  template, retry_delay=0, retry_errors=[15029])
+
+        self.assertEqual(result.codes, [0, 0, 0, 15025, 0, 0])
+        self.assertEqual(result.failed(), {3: 15025})
+        self.assertEqual(result.retries, [0, 0, 1, 0, 0, 1])
+        self.assertEqual(sorted(result.jobids[:3] + result.jobids[4:]),
+                         ['1.master', '2.master', '3.master', '4.master', '5.master'])
+        self.assertEqual(self.server.connects, 2)
+
+        scripts = dict([(s[0], s) for s in submitted])
+        self.assertTrue(scripts['a.sh'][1] is scripts['c.sh'][1])
+        self.assertEqual(scripts['a.sh'][2], 'batch')
+        self.assertEqual([(a.name, a.resource, a.value, a.op) for a in scripts['b.sh'][1]],
+                         [('Job_Name', None, 'other', PBSQuery.pbs.SET),
+                          ('Resource_List', 'walltime', '01:00:00', PBSQuery.pbs.SET)])
+
+        stats = result.stats()
+        self.assertEqual((stats['submitted'], stats['failed'], stats['retries']), (5, 1, 2))
+        self.assertTrue(stats['p95'] >= stats['p50'] >= stats['min'])
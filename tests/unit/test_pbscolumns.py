@@ -0,0 +1,45 @@
+import unittest
+
+from pbs import PBSColumns, PBSQuery
+
+try:
+    from .test_pbsquery import _FakeServer, _Item
+except (ImportError, ValueError):
+    from test_pbsquery import _FakeServer, _Item
+
+
+class TestPBSColumnsUnit(unittest.TestCase):
+    def setUp(self):
+        self.server = _FakeServer(PBSQuery.pbs)
+
+    def tearDown(self):
+        self.server.restore()
+
+    def test_to_columns(self):
+        self.server.nodes = [
+            _Item('node1', [('state', 'free'), ('np', '24'),
+                            ('status', 'physmem=65850220kb,availmem=77961112kb,loadave=18.07')]),
+            _Item('node2', [('state', 'down'), ('np', '8')]),
+            _Item('node3', [('state', 'free'), ('np', '8'), ('status', 'physmem=1gb,loadave=x')]),
+        ]
+        nodes = PBSQuery.PBSQuery('master').getnodes()
+        columns = PBSColumns.to_columns(nodes)
+        self.assertEqual(columns['name'], ['node1', 'node2', 'node3'])
+        self.assertEqual(columns['state'], [0, 1, 0])
+        self.assertEqual(columns.categories['state'], ['free', 'down'])
+        self.assertEqual(columns['np'], [24, 8, 8])
+        self.assertEqual(columns['physmem'], [65850220 * 1024, None, 1024 ** 3])
+        self.assertEqual(columns['loadave'], [18.07, None, None])
+
+        columns = PBSColumns.to_columns(nodes, [('np', 'np', 'str')])
+        self.assertEqual(list(columns.keys()), ['name', 'np'])
+        self.assertEqual(columns['np'], ['24', '8', '8'])
+
+        if PBSColumns.numpy is None:
+            self.assertRaises(ImportError, PBSColumns.to_numpy, nodes)
+            return
+
+        arrays = PBSColumns.to_numpy(nodes)
+        self.assertEqual(arrays['np'].sum(), 40)
+        self.assertEqual(arrays['physmem'].tolist(), [65850220 * 1024, -1, 1024 ** 3])
+        self.assertEqual(arrays['np'][arrays['state'] == arrays.categories['state'].index('free')].sum(), 32)
@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from pbs import PBSProxy, PBSQuery
+
+try:
+    from .test_pbsquery import _FakeServer, _Item
+except (ImportError, ValueError):
+    from test_pbsquery import _FakeServer, _Item
+
+
+class TestPBSProxyUnit(unittest.TestCase):
+    def setUp(self):
+        self.server = _FakeServer(PBSQuery.pbs)
+
+    def tearDown(self):
+        self.server.restore()
+
+    def _start_proxy(self, calls, delay=0.2):
+        """Start a PBSProxy for master, pbs_statjob takes delay seconds"""
+        self.server.jobs = [_Item('1.master', [('job_state', 'R'), ('exec_host', 'node1/0-3'), ('euser', 'bas')])]
+
+        def pbs_statjob(con, name, attribs, extend):
+            calls.append(name)
+            time.sleep(delay)
+            return list(self.server.jobs)
+
+        PBSQuery.pbs.pbs_statjob = pbs_statjob
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'proxy.sock')
+
+        proxy = PBSProxy.PBSProxy(path, 'master', max_connections=2, ttl=60)
+        t = threading.Thread(target=proxy.serve_forever)
+        t.daemon = True
+        t.start()
+        self.addCleanup(proxy.shutdown)
+        return proxy, path
+
+    def test_proxy(self):
+        calls = []
+        proxy, path = self._start_proxy(calls)
+        tmpdir = os.path.dirname(path)
+
+        p = PBSQuery.PBSQuery('master')
+        expected = repr(p.getjob('1.master'))
+        del calls[:]
+
+        # Many scripts ask for the same job at the same time
+        #
+        results = []
+        queries = [PBSQuery.PBSQuery('master', proxy=path) for i in range(8)]
+        threads = [threading.Thread(target=lambda q=q: results.append(repr(q.getjob('1.master')))) for q in queries]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [expected] * 8)
+        self.assertEqual(calls, ['1.master'])
+        self.assertEqual(repr(queries[0].getjob('1.master')), expected)
+        self.assertEqual(queries[0].getjob('1.master')['exec_host'], ['node1/0-3'])
+        self.assertEqual(calls, ['1.master'])
+
+        stats = proxy.stats()
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['hits'] + stats['coalesced'], stats['requests'] - 2)
+        # Only the proxy frees the pbs_stat*() lists
+        self.assertEqual(self.server.frees, 4)
+
+        self.assertRaises(PBSQuery.PBSError, queries[0].proxy.call, 'pbs_deljob', '1.master', 'NULL')
+        for q in queries:
+            q.proxy.close()
+
+        # An other server or no proxy, the queries go to the pbs_server
+        #
+        client = PBSProxy.PBSProxyClient(path, server='other')
+        self.assertRaises(PBSQuery.PBSProxyUnavailable, client.call, 'pbs_statjob', '1.master', 'NULL', 'NULL')
+        client.close()
+
+        other = PBSQuery.PBSQuery('other', proxy=path)
+        self.assertEqual(other.proxy, None)
+        self.assertEqual(repr(other.getjob('1.master')), expected)
+        self.assertEqual(calls, ['1.master', '1.master'])
+
+        missing = PBSQuery.PBSQuery('master', proxy=os.path.join(tmpdir, 'none.sock'))
+        self.assertEqual(missing.proxy, None)
+        self.assertEqual(repr(missing.getjob('1.master')), expected)
+
+    def test_proxy_attribute_list(self):
+        calls = []
+        proxy, path = self._start_proxy(calls)
+
+        # Every client makes its own attrl list, op is not initialized
+        #
+        results = []
+        queries = [PBSQuery.PBSQuery('master', proxy=path) for i in range(5)]
+        threads = [threading.Thread(target=lambda q=q: results.append(repr(q.getjob('1.master', ['job_state', 'euser']))))
+                   for q in queries]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for q in queries:
+            q.proxy.close()
+
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(calls, ['1.master'])
+        self.assertEqual(proxy.stats()['misses'], 2)
+
+    def test_proxy_timeout(self):
+        calls = []
+        proxy, path = self._start_proxy(calls, delay=0.5)
+
+        client = PBSProxy.PBSProxyClient(path, timeout=0.1, server='master')
+        self.assertRaises(PBSQuery.PBSProxyUnavailable, client.call, 'pbs_statjob', '1.master', 'NULL', 'NULL')
+        self.assertEqual(client._socket, None)
+
+        # The query goes to the pbs_server when the proxy does not answer
+        #
+        p = PBSQuery.PBSQuery('master', proxy=PBSProxy.PBSProxyClient(path, timeout=0.1, server='master'))
+        self.assertEqual(p.getjob('1.master')['euser'], ['bas'])
+        self.assertEqual(p.proxy, None)
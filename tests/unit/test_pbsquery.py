@@ -0,0 +1,536 @@
+import ctypes
+import random
+import sys
+import threading
+import time
+import unittest
+
+from pbs import PBSColumns, PBSQuery
+
+
+class _Attr:
+    def __init__(self, name, value, resource=None):
+        self.name = name
+        self.resource = resource
+        self.value = value
+
+
+class _Item:
+    def __init__(self, name, attribs):
+        self.name = name
+        self.attribs = [_Attr(*a) for a in attribs]
+
+
+class _FakeServer:
+    """Replaces the pbs_* functions used by PBSQuery"""
+
+    FUNCTIONS = ['pbs_connect', 'pbs_disconnect', 'pbs_statserver', 'pbs_statjob',
+                 'pbs_statnode', 'pbs_statque', 'pbs_statfree', 'error',
+                 'new_attropl', 'pbs_selstat', 'pbs_selectjob', 'pbs_deljob',
+                 'new_attrl', 'pbs_alterjob_async', 'pbs_submit']
+
+    def __init__(self, module):
+        self.module = module
+        self.saved = dict((f, getattr(module, f)) for f in self.FUNCTIONS)
+        self.connects = 0
+        self.disconnects = 0
+        self.frees = 0
+        self.errno = 0
+        self.jobs = []
+        self.nodes = []
+        self.criteria = None
+
+        module.pbs_connect = self.pbs_connect
+        module.pbs_disconnect = self.pbs_disconnect
+        module.pbs_statserver = lambda con, attribs, extend: [_Item('master', [('pbs_version', '6.0')])]
+        module.pbs_statjob = lambda con, name, attribs, extend: list(self.jobs)
+        module.pbs_statnode = lambda con, name, attribs, extend: list(self.nodes)
+        module.pbs_statque = lambda con, name, attribs, extend: []
+        module.pbs_statfree = self.pbs_statfree
+        module.error = lambda: (self.errno, '')
+        module.new_attropl = lambda n: [_Attr(None, None) for i in range(n)]
+        module.new_attrl = self.new_attrl
+        module.pbs_selstat = self.pbs_selstat
+        module.pbs_selectjob = lambda con, attropl, extend: [j.name for j in self.pbs_selstat(con, attropl, extend)]
+        for name in ['pbs_statserver', 'pbs_statjob', 'pbs_statnode', 'pbs_statque', 'pbs_selectjob']:
+            getattr(module, name).__name__ = name
+
+    def pbs_connect(self, server):
+        self.connects += 1
+        return self.connects
+
+    def pbs_disconnect(self, con):
+        self.disconnects += 1
+
+    def pbs_statfree(self, l):
+        self.frees += 1
+
+    def new_attrl(self, n):
+        """Like the C function op is not initialized"""
+        attribs = [_Attr(None, None) for i in range(n)]
+        for a in attribs:
+            a.op = random.randrange(2 ** 31)
+        return attribs
+
+    def pbs_selstat(self, con, attropl, extend):
+        """Only supports EQ on attributes without resource"""
+        self.criteria = [(a.name, a.resource, a.op, a.value) for a in attropl]
+        jobs = []
+        for j in self.jobs:
+            values = dict([(a.name, a.value) for a in j.attribs])
+            if [a for a in attropl if values.get(a.name) != a.value]:
+                continue
+            jobs.append(j)
+        return jobs
+
+    def restore(self):
+        for name, func in self.saved.items():
+            setattr(self.module, name, func)
+
+
+class TestPBSQueryUnit(unittest.TestCase):
+    def setUp(self):
+        self.server = _FakeServer(PBSQuery.pbs)
+
+    def tearDown(self):
+        self.server.restore()
+
+    def test_connection_per_query(self):
+        p = PBSQuery.PBSQuery('master')
+        p.getjobs()
+        self.assertEqual(self.server.connects, 2)
+        self.assertEqual(self.server.disconnects, 2)
+
+    def test_pool_reuses_connection(self):
+        p = PBSQuery.PBSQuery('master', pool=PBSQuery.PBSConnectionPool('master', 2))
+        p.getjobs()
+        p.getnodes()
+        stats = p.pool.stats()
+        self.assertEqual(self.server.connects, 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['idle'], 1)
+
+    def test_pool_reconnects_on_error(self):
+        p = PBSQuery.PBSQuery('master', pool=PBSQuery.PBSConnectionPool('master', 2))
+        self.server.errno = 15033
+        p.getjobs()
+        self.assertEqual(self.server.connects, 2)
+        self.assertEqual(self.server.disconnects, 1)
+        self.assertEqual(p.pool.stats()['reconnects'], 1)
+
+        p.pool.close()
+        self.assertEqual(p.pool.stats()['idle'], 0)
+        self.assertEqual(self.server.disconnects, 2)
+
+    def test_pool_keeps_connection_on_job_error(self):
+        p = PBSQuery.PBSQuery('master', pool=PBSQuery.PBSConnectionPool('master', 2))
+        self.server.errno = 15001
+        p.getjobs()
+        p.getjobs()
+        self.assertEqual(self.server.connects, 1)
+        self.assertEqual(self.server.disconnects, 0)
+        self.assertEqual(p.pool.stats()['reconnects'], 0)
+        p.pool.close()
+
+    def test_lazy_data_structure(self):
+        self.server.nodes = [
+            _Item('node1', [('state', 'free'), ('np', '2'),
+                            ('status', 'rectime=1,message=EVENT:kernel=upgrade,jobs=1.master(cput=1,mem=1kb) 2.master(cput=2)')]),
+        ]
+        p = PBSQuery.PBSQuery('master')
+        nodes = p.getnodes()
+
+        p.lazy_data_structure()
+        lazy = p.getnodes()
+        node = lazy['node1']
+        self.assertTrue(node.is_free())
+        self.assertTrue('status' in node._raw)
+        self.assertEqual(node['event']['kernel'], ['upgrade'])
+        self.assertFalse('status' in node._raw)
+        self.assertEqual(sorted(node.keys()), sorted(nodes['node1'].keys()))
+        for key in node.keys():
+            self.assertEqual(repr(node[key]), repr(nodes['node1'][key]))
+
+    def test_lazy_data_structure_threads(self):
+        names = ['attr%d' % i for i in range(20)]
+        self.server.jobs = [_Item('%d.master' % i, [(n, 'value%d' % i) for n in names])
+                            for i in range(200)]
+        p = PBSQuery.PBSQuery('master')
+        p.lazy_data_structure()
+        jobs = p.getjobs()
+
+        errors = []
+        def read(order):
+            try:
+                for name, job in jobs.items():
+                    for n in order:
+                        if job[n] != ['value%s' % name.split('.')[0]]:
+                            errors.append((name, n, job[n]))
+            except Exception as detail:
+                errors.append(detail)
+
+        if hasattr(sys, 'setswitchinterval'):
+            interval = sys.getswitchinterval()
+            sys.setswitchinterval(1e-6)
+        threads = [threading.Thread(target=read, args=(names[i:] + names[:i],)) for i in range(4)]
+        try:
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            if hasattr(sys, 'setswitchinterval'):
+                sys.setswitchinterval(interval)
+        self.assertEqual(errors, [])
+
+    def test_snapshot_cache(self):
+        self.server.jobs = [_Item('1.master', [('job_state', 'R')])]
+        p = PBSQuery.PBSQuery('master')
+        cache = p.enable_cache(ttl=60, max_entries=2)
+
+        jobs = p.getjobs()
+        self.assertTrue(p.getjobs() is jobs)
+        self.assertTrue(p.getjobs(['job_state']) is not jobs)
+        self.assertEqual(self.server.connects, 3)
+
+        p.getnodes()
+        self.assertEqual(cache.stats()['entries'], 2)
+        self.assertTrue(p.getjobs() is not jobs)
+
+        p.invalidate('job')
+        self.assertEqual(cache.stats()['entries'], 1)
+        p.invalidate()
+        self.assertEqual(cache.stats()['entries'], 0)
+
+        # A shared cache, lazy objects are not returned to eager queries
+        #
+        lazy = PBSQuery.PBSQuery('master')
+        lazy.cache = cache
+        lazy.lazy_data_structure()
+        jobs = p.getjobs()
+        self.assertTrue(lazy.getjobs() is not jobs)
+        self.assertTrue(lazy.getjobs()['1.master']._raw)
+        self.assertTrue(p.getjobs() is jobs)
+
+    def test_instrumentation(self):
+        self.server.jobs = [_Item('%d.master' % i, [('job_state', 'Q'), ('queue', 'batch')]) for i in range(3)]
+        p = PBSQuery.PBSQuery('master')
+        p.getjobs()
+        self.assertEqual(p.INSTRUMENT, None)
+
+        records = []
+        stats = p.enable_instrumentation()
+        stats.add_hook(lambda *args: records.append(args))
+        p.getjobs()
+        p.getjobs()
+
+        snapshot = stats.snapshot()
+        self.assertEqual(sorted(snapshot.keys()), ['parse.job', 'pbs_connect', 'pbs_statjob'])
+        self.assertEqual(snapshot['pbs_connect']['count'], 2)
+        self.assertEqual(snapshot['pbs_statjob']['objects'], 6)
+        self.assertEqual(snapshot['parse.job']['attributes'], 12)
+        self.assertEqual(sum([n for bound, n in snapshot['parse.job']['histogram']]), 2)
+        self.assertEqual(snapshot['parse.job']['histogram'][-1][0], None)
+        self.assertEqual([r[0] for r in records], ['pbs_connect', 'pbs_statjob', 'parse.job'] * 2)
+
+        self.server.errno = 15033
+        p.getnodes()
+        self.assertEqual(stats.snapshot()['pbs_statnode']['errors'], 1)
+
+        p.disable_instrumentation()
+        p.getjobs()
+        self.assertEqual(stats.snapshot()['pbs_statjob']['count'], 2)
+
+    def test_iterjobs(self):
+        self.server.jobs = [_Item('%d.master' % i, [('job_state', 'Q')]) for i in range(3)]
+        p = PBSQuery.PBSQuery('master')
+        frees = self.server.frees
+
+        names = [j.name for j in p.iterjobs()]
+        self.assertEqual(names, ['0.master', '1.master', '2.master'])
+        self.assertEqual(self.server.frees, frees + 1)
+
+        jobs = p.iterjobs()
+        self.assertEqual(next(jobs)['job_state'], ['Q'])
+        jobs.close()
+        self.assertEqual(self.server.frees, frees + 2)
+
+    def test_compact_objects(self):
+        self.server.jobs = [
+            _Item('1.master', [('job_state', 'R'), ('Resource_List', '1:ppn=2', 'nodes'), ('exec_host', 'node1/0-1')]),
+            _Item('2.master', [('job_state', 'Q'), ('Resource_List', '1:ppn=4', 'nodes'), ('exec_host', 'node2/0-3')]),
+        ]
+        jobs = PBSQuery.PBSQuery('master').getjobs()
+        job1 = jobs['1.master']
+        job2 = jobs['2.master']
+
+        self.assertTrue(job1._shape is job2._shape)
+        self.assertFalse(hasattr(job1, '__dict__'))
+        self.assertEqual(job1.keys(), ['job_state', 'Resource_List', 'exec_host'])
+        self.assertEqual(job1['Resource_List']['nodes'], ['1:ppn=2'])
+        self.assertEqual(job1.return_value('job_state'), 'R')
+        self.assertEqual(job2.get_nodes(), ['node2/0', 'node2/1', 'node2/2', 'node2/3'])
+        self.assertEqual(job1.job_state, ['R'])
+        self.assertRaises(PBSQuery.PBSError, getattr, job1, 'queue')
+
+        new = job1.copy()
+        del new['exec_host']
+        self.assertEqual(new.keys(), ['job_state', 'Resource_List'])
+        self.assertEqual(len(job1), 3)
+        self.assertEqual(new, {'job_state': ['R'], 'Resource_List': {'nodes': ['1:ppn=2']}})
+
+    def test_shapes_bounded(self):
+        def count(shape):
+            return 1 + sum([count(s) for s in shape._next.values()])
+
+        p = PBSQuery.PBSQuery('master')
+        self.server.jobs = [_Item('0.master', [('job_state', 'R'), ('Variable_List', 'A=1'),
+                                               ('Resource_List', '1', 'nodes')])]
+        p.getjobs()
+        shapes = count(PBSQuery.job._root_shape)
+
+        self.server.jobs = [_Item('%d.master' % i, [('job_state', 'R'), ('Variable_List', 'VAR%d=1,B=2' % i),
+                                                    ('Resource_List', '1', 'res%d' % i)])
+                            for i in range(100)]
+        jobs = p.getjobs()
+        self.assertEqual(count(PBSQuery.job._root_shape), shapes)
+        self.assertEqual(jobs['7.master']['Variable_List'], {'VAR7': ['1'], 'B': ['2']})
+        self.assertEqual(jobs['7.master']['Resource_List'].res7, ['1'])
+        self.assertTrue(jobs['7.master']['Resource_List'].has_key('res7'))
+
+    def test_split_brace(self):
+        status = ('rectime=1424696750,varattr=,jobs=419[1].master(cput=236745,mem=6562224kb,walltime=22647) '
+                  '446[1].master(cput=7385,mem=202936kb,walltime=7391),state=free,size=456341748kb:459945088kb,'
+                  'message=EVENT:sample.time=1288864220.003,EVENT:kernel=upgrade,,'
+                  'uname=Linux node24 3.10.0 #1 SMP Wed Feb 4 08:16:54 CET 2015 x86_64')
+        values = ['a(b,c)d,e', '(a),b', 'a(b,c', 'a=(b)=c', 'a(b\n)c,d', 'a)b(c),d', '', ',,']
+        for value in [status] + values:
+            for sep, reg in [(',', PBSQuery.REG_SPLIT_COMMA_BRACE), ('=', PBSQuery.REG_SPLIT_EQUAL_BRACE)]:
+                self.assertEqual(PBSQuery.split_brace(value, sep), [x[1] for x in reg.findall(value)])
+
+        for field in PBSQuery.split_brace(status, ','):
+            self.assertEqual(PBSQuery.split_brace(field, '='),
+                             [x[1] for x in PBSQuery.REG_SPLIT_EQUAL_BRACE.findall(field)])
+
+    def test_select_jobs(self):
+        self.server.jobs = [
+            _Item('1.master', [('job_state', 'R'), ('euser', 'bas'), ('queue', 'long')]),
+            _Item('2.master', [('job_state', 'Q'), ('euser', 'bas'), ('queue', 'long')]),
+            _Item('3.master', [('job_state', 'R'), ('euser', 'roy'), ('queue', 'long')]),
+        ]
+        p = PBSQuery.PBSQuery('master')
+        jobs = p.getjobs(['job_state'], select={'euser': 'bas', 'job_state': 'R'})
+        self.assertEqual(list(jobs.keys()), ['1.master'])
+        self.assertEqual(jobs['1.master'].keys(), ['job_state'])
+        self.assertEqual(self.server.criteria, [('euser', None, PBSQuery.pbs.EQ, 'bas'),
+                                                ('job_state', None, PBSQuery.pbs.EQ, 'R')])
+
+        p.select_jobs([('Resource_List.walltime', PBSQuery.pbs.GT, '24:00:00')])
+        self.assertEqual(self.server.criteria, [('Resource_List', 'walltime', PBSQuery.pbs.GT, '24:00:00')])
+
+        self.assertEqual(sorted(p.select_jobids({'queue': 'long', 'job_state': 'R'})), ['1.master', '3.master'])
+
+    def test_getall(self):
+        self.server.jobs = [_Item('1.master', [('job_state', 'R')])]
+        self.server.nodes = [_Item('node1', [('state', 'free')])]
+        p = PBSQuery.PBSQuery('master', pool=True)
+        jobs, nodes, queues = p.getall()
+        self.assertEqual(list(jobs.keys()), ['1.master'])
+        self.assertEqual(list(nodes.keys()), ['node1'])
+        self.assertEqual(queues, {})
+        self.assertEqual(p.pool.stats()['busy'], 0)
+
+    def test_federated_query(self):
+        self.server.jobs = [_Item('1.master', [('job_state', 'R')])]
+        slow = threading.Event()
+        cons = {'master1': 1, 'master2': 2, 'slow': 3}
+        statjob = PBSQuery.pbs.pbs_statjob
+        PBSQuery.pbs.pbs_connect = lambda server: cons[server]
+        PBSQuery.pbs.pbs_statjob = lambda con, *args: con == 3 and slow.wait(5) or statjob(con, *args)
+        try:
+            f = PBSQuery.PBSFederatedQuery(['master1', 'master2', 'slow', 'master1'], timeout=0.5)
+            jobs = f.getjobs()
+        finally:
+            slow.set()
+
+        self.assertEqual(f.servers, ['master1', 'master2', 'slow'])
+        self.assertEqual(sorted(jobs.keys()), ['1.master@master1', '1.master@master2'])
+        self.assertEqual(f.split_key('1.master@master2'), ('1.master', 'master2'))
+
+        stats = f.stats()
+        self.assertEqual(stats['slow']['timeouts'], 1)
+        self.assertEqual(stats['master1']['timeouts'], 0)
+        self.assertEqual(stats['master1']['calls'], 1)
+        self.assertTrue(stats['master1']['latency'] < 0.5)
+
+    def test_federated_query_gil(self):
+        # A library call that keeps the GIL, like the _pbs extension
+        #
+        usleep = ctypes.PyDLL(None).usleep
+        self.server.jobs = [_Item('1.master', [('job_state', 'R')])]
+        cons = {'master1': 1, 'slow': 2}
+        statjob = PBSQuery.pbs.pbs_statjob
+
+        def slow_statjob(con, *args):
+            if con == 2:
+                while f.stats()['master1']['latency'] is None:
+                    time.sleep(0.01)
+                usleep(300000)
+            return statjob(con, *args)
+
+        PBSQuery.pbs.pbs_connect = lambda server: cons[server]
+        PBSQuery.pbs.pbs_statjob = slow_statjob
+        f = PBSQuery.PBSFederatedQuery(['master1', 'slow'], timeout=0.1)
+        jobs = f.getjobs()
+
+        self.assertEqual(list(jobs.keys()), ['1.master@master1'])
+        stats = f.stats()
+        self.assertEqual(stats['slow']['timeouts'], 1)
+        self.assertEqual(stats['master1']['timeouts'], 0)
+
+    def test_watcher(self):
+        self.server.jobs = [
+            _Item('1.master', [('job_state', 'R'), ('Resource_List', '1:ppn=2', 'nodes')]),
+            _Item('2.master', [('job_state', 'Q'), ('Resource_List', '1:ppn=4', 'nodes')]),
+        ]
+        w = PBSQuery.PBSWatcher(PBSQuery.PBSQuery('master'), kinds=['job'])
+        events = []
+        w.add_listener(events.append)
+
+        changes = w.poll()
+        self.assertEqual(sorted([(c.action, c.name) for c in changes]),
+                         [('added', '1.master'), ('added', '2.master')])
+        self.assertEqual(changes[0].changed, set(['job_state', 'Resource_List']))
+        job1 = w.snapshot['job']['1.master']
+
+        self.assertEqual(w.poll(), [])
+
+        self.server.jobs = [
+            _Item('1.master', [('job_state', 'R'), ('Resource_List', '1:ppn=2', 'nodes')]),
+            _Item('2.master', [('job_state', 'R'), ('Resource_List', '1:ppn=4', 'nodes')]),
+            _Item('3.master', [('job_state', 'Q')]),
+        ]
+        self.server.jobs.pop(0)
+        changes = list(w.watch(count=1))
+        self.assertEqual(sorted([(c.action, c.name, sorted(c.changed)) for c in changes]),
+                         [('added', '3.master', ['job_state']),
+                          ('changed', '2.master', ['job_state']),
+                          ('removed', '1.master', ['Resource_List', 'job_state'])])
+        removed = [c for c in changes if c.action == 'removed'][0]
+        self.assertTrue(removed.object is job1)
+        self.assertEqual(sorted(w.snapshot['job'].keys()), ['2.master', '3.master'])
+        self.assertEqual(w.snapshot['job']['2.master']['job_state'], ['R'])
+        self.assertEqual(len(events), 5)
+
+    def test_watcher_ignore(self):
+        self.server.nodes = [_Item('node1', [('state', 'free'), ('status', 'rectime=1')])]
+        w = PBSQuery.PBSWatcher(PBSQuery.PBSQuery('master'), kinds=['node'], ignore=['status'])
+        changes = w.poll()
+        self.assertEqual(changes[0].changed, set(['state']))
+
+        self.server.nodes = [_Item('node1', [('state', 'free'), ('status', 'rectime=2')])]
+        self.assertEqual(w.poll(), [])
+        self.assertEqual(w.snapshot['node']['node1']['status'], {'rectime': ['2']})
+
+        self.server.nodes = [_Item('node1', [('state', 'down'), ('status', 'rectime=3')])]
+        changes = w.poll()
+        self.assertEqual([(c.action, c.changed) for c in changes], [('changed', set(['state']))])
+        self.assertEqual(changes[0].object['status'], {'rectime': ['3']})
+
+    def test_index(self):
+        self.server.jobs = [
+            _Item('1.master', [('job_state', 'R'), ('exec_host', 'node1/0-1+node2/0')]),
+            _Item('2.master', [('job_state', 'R'), ('exec_host', 'node1/2')]),
+            _Item('3.master', [('job_state', 'Q')]),
+        ]
+        self.server.nodes = [_Item('node%d' % i, [('state', 'free')]) for i in range(1, 4)]
+        w = PBSQuery.PBSWatcher(PBSQuery.PBSQuery('master'), kinds=['node', 'job'])
+        index = PBSQuery.PBSIndex()
+        index.apply(w.poll())
+
+        self.assertEqual(index.jobs_on('node1'), set(['1.master', '2.master']))
+        self.assertEqual(index.jobs_on('node3'), set())
+        self.assertEqual(index.nodes_of('1.master'), ['node1', 'node2'])
+        self.assertEqual(index.nodes_of('3.master'), [])
+        self.assertEqual(index.cores_of('1.master'), {'node1': [0, 1], 'node2': [0]})
+
+        self.server.jobs[0] = _Item('1.master', [('job_state', 'R'), ('exec_host', 'node3/0')])
+        del self.server.jobs[1]
+        index.apply(w.poll())
+        self.assertEqual(index.jobs_on('node1'), set())
+        self.assertEqual(index.jobs_on('node3'), set(['1.master']))
+        self.assertEqual(index.nodes_of('2.master'), [])
+
+        self.assertEqual(index.refresh(w.snapshot['job'], w.snapshot['node']), 0)
+        jobs = dict(w.snapshot['job'])
+        jobs['4.master'] = PBSQuery.job({'exec_host': ['node2/1']})
+        self.assertEqual(index.refresh(jobs), 1)
+        self.assertEqual(index.jobs_on('node2'), set(['4.master']))
+
+    def test_range_set(self):
+        r = PBSQuery.convert_range('3,5,7-9', compact=True)
+        self.assertEqual(list(r), PBSQuery.convert_range('3,5,7-9'))
+        self.assertEqual((len(r), '8' in r, 8 in r, '6' in r, 'x' in r), (5, True, True, False, False))
+        self.assertEqual(str(r | PBSQuery.RangeSet('4,6,10')), '3-10')
+        self.assertEqual(str(r & PBSQuery.RangeSet('1-3,8-20')), '3,8-9')
+        self.assertEqual(PBSQuery.RangeSet('1-2,3'), PBSQuery.RangeSet('1-3'))
+
+        j = PBSQuery.job({'exec_host': ['node1/0-3+node2/0', '2', '5-63']})
+        nodes = j.get_nodes(compact=True)
+        self.assertEqual(len(nodes), 65)
+        self.assertEqual(list(nodes), j.get_nodes())
+        self.assertTrue('node2/40' in nodes)
+        self.assertFalse('node1/4' in nodes)
+        self.assertEqual(str(nodes), 'node1/0-3+node2/0,2,5-63')
+        self.assertEqual(j.get_nodes(unique=True, compact=True), ['node1', 'node2'])
+
+        n = PBSQuery.node({'jobs': ['0-1', '3/1.master', '2/2.master']})
+        jobs = n.get_jobs(compact=True)
+        self.assertEqual(list(jobs), n.get_jobs())
+        self.assertTrue('3/1.master' in jobs)
+        self.assertEqual(len(PBSQuery.node().get_jobs(compact=True)), 0)
+
+    def test_convert_size_and_time(self):
+        self.assertEqual(PBSQuery.convert_size('6562224kb'), 6562224 * 1024)
+        self.assertEqual(PBSQuery.convert_size('2GB'), 2 * 1024 ** 3)
+        self.assertEqual(PBSQuery.convert_size('100'), 100)
+        self.assertEqual(PBSQuery.convert_size('4mw'), 4 * 1024 ** 2 * 8)
+        self.assertEqual(PBSQuery.convert_size('lots'), None)
+        self.assertEqual(PBSQuery.convert_time('01:23:45'), 5025)
+        self.assertEqual(PBSQuery.convert_time('2:00:00:01'), 2 * 86400 + 1)
+        self.assertEqual(PBSQuery.convert_time('236745'), 236745)
+        self.assertEqual(PBSQuery.convert_time('1:xx'), None)
+
+    def test_typed_data_structure(self):
+        self.server.jobs = [
+            _Item('1.master', [('job_state', 'R'), ('Resource_List', '24:00:00', 'walltime'),
+                               ('resources_used', '6562224kb', 'mem'), ('Rerunable', 'True'),
+                               ('ctime', '1424690000'), ('Priority', 'high')]),
+            _Item('2.master', [('job_state', 'Q'), ('Resource_List', '24:00:00', 'walltime')]),
+        ]
+        self.server.nodes = [_Item('node1', [('np', '8'), ('status', 'physmem=1gb,loadave=0.50,opsys=linux')])]
+        p = PBSQuery.PBSQuery('master')
+        p.typed_data_structure()
+        job = p.getjobs()['1.master']
+        self.assertEqual(job['Resource_List']['walltime'], [86400])
+        self.assertEqual(job['resources_used']['mem'], [6562224 * 1024])
+        self.assertEqual(job['Rerunable'], [True])
+        self.assertEqual(job['ctime'], [1424690000])
+        self.assertEqual(job['Priority'], ['high'])
+        self.assertEqual(job['job_state'], ['R'])
+
+        p.lazy_data_structure()
+        node = p.getnodes()['node1']
+        self.assertEqual(node['np'], [8])
+        self.assertEqual(node['status']['physmem'], [1024 ** 3])
+        self.assertEqual(node['status']['loadave'], [0.5])
+        self.assertEqual(node['status']['opsys'], ['linux'])
+        self.assertEqual(PBSColumns.to_columns({'node1': node})['physmem'], [1024 ** 3])
+
+        types = p.TYPES
+        self.assertTrue(types.converter('Resource_List', 'walltime') is types.converter('resources_used', 'walltime'))
+        self.assertEqual(types.converter('job_state'), None)
+
+        p.typed_data_structure(None)
+        self.assertEqual(p.getjobs()['1.master']['Resource_List']['walltime'], ['24:00:00'])
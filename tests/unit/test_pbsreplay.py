@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pbs import PBSQuery, PBSReplay
+
+try:
+    from .test_pbsquery import _FakeServer, _Item
+except (ImportError, ValueError):
+    from test_pbsquery import _FakeServer, _Item
+
+
+class TestPBSReplayUnit(unittest.TestCase):
+    def setUp(self):
+        self.server = _FakeServer(PBSQuery.pbs)
+
+    def tearDown(self):
+        self.server.restore()
+
+    def test_record_replay(self):
+        self.server.jobs = [
+            _Item('1.master', [('job_state', 'R'), ('exec_host', 'node1/0-3'),
+                               ('Variable_List', 'PBS_O_HOME=/home/bas,PBS_O_PATH=/bin:/usr/bin')]),
+            _Item('2.master', [('job_state', 'Q'), ('Resource_List', '01:00:00', 'walltime')]),
+        ]
+        self.server.nodes = [_Item('node1', [('state', 'free'), ('jobs', '0-3/1.master')])]
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        filename = os.path.join(tmpdir, 'master.rec.gz')
+
+        p = PBSReplay.PBSRecordingQuery('master', recorder=filename)
+        jobs = p.getjobs()
+        nodes = p.getnodes(['state', 'jobs'])
+        self.server.jobs = self.server.jobs[:1]
+        one = p.getjobs()
+        p.recorder.close()
+        self.assertEqual(p.recorder.records, 4)
+
+        connects = self.server.connects
+        r = PBSReplay.PBSReplayQuery(filename)
+        self.assertEqual(r.server, 'master')
+        self.assertEqual(repr(r.getjobs()), repr(jobs))
+        self.assertEqual(repr(r.getjobs()), repr(one))
+        self.assertEqual(repr(r.getjobs()), repr(one))
+        self.assertEqual(r.getnodes(['state', 'jobs'])['node1'].get_jobs(), ['0/1.master', '1/1.master', '2/1.master', '3/1.master'])
+        self.assertEqual(repr(r.getnodes(['state', 'jobs'])), repr(nodes))
+        self.assertEqual(self.server.connects, connects)
+        self.assertRaises(PBSQuery.PBSError, r.getnodes)
+
+        r.replay.rewind()
+        self.assertEqual(sorted(r.getjobs().keys()), ['1.master', '2.master'])
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pbs import PBSQuery, PBSShared
+
+try:
+    from .test_pbsquery import _FakeServer, _Item
+except (ImportError, ValueError):
+    from test_pbsquery import _FakeServer, _Item
+
+
+class TestPBSSharedUnit(unittest.TestCase):
+    def setUp(self):
+        self.server = _FakeServer(PBSQuery.pbs)
+
+    def tearDown(self):
+        self.server.restore()
+
+    def test_shared_snapshot(self):
+        self.server.jobs = [_Item('1.master', [('job_state', 'R'), ('euser', 'bas')]),
+                            _Item('2.master', [('job_state', 'Q'), ('euser', 'jan')])]
+        self.server.nodes = [_Item('node1', [('state', 'free'), ('properties', 'ib,fat')]),
+                             _Item('node2', [('state', 'down'), ('properties', 'ib')])]
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'master.snap')
+
+        publisher = PBSShared.PBSSnapshotPublisher(path, PBSQuery.PBSQuery('master'))
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+        self.assertRaises(PBSQuery.PBSError, PBSShared.PBSSharedQuery, path)
+        self.assertEqual(publisher.publish(), 2)
+
+        connects = self.server.connects
+        p = PBSQuery.PBSQuery('master')
+        shared = PBSShared.PBSSharedQuery(path)
+        self.assertEqual(shared.server, 'master')
+        self.assertEqual(repr(shared.getjobs()), repr(p.getjobs()))
+        self.assertEqual(repr(shared.getnodes()), repr(p.getnodes()))
+        self.assertEqual(self.server.connects, connects + 3)
+
+        self.assertEqual(shared.getjobs(['euser'])['2.master'].keys(), ['euser'])
+        self.assertEqual(shared.getnode('node2')['state'], ['down'])
+        self.assertEqual(sorted(shared.getnodes_with_property('fat').keys()), ['node1'])
+        self.assertTrue(shared.age() < 60)
+
+        data = shared.reader.read()
+        self.assertTrue(shared.reader.read() is data)
+
+        # A larger snapshot grows the file
+        #
+        self.server.jobs.extend([_Item('%d.master' % i, [('job_state', 'Q')]) for i in range(3, 2000)])
+        publisher.run(count=1)
+        self.assertEqual(len(shared.getjobs()), 1999)
+        self.assertEqual(shared.generation, 4)
+        publisher.close()
+
+        self.assertEqual(PBSShared.PBSSnapshotPublisher(path, p).generation, 4)
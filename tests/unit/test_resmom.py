@@ -0,0 +1,184 @@
+import time
+import unittest
+
+from pbs import resmom
+
+
+class _FakeMoms:
+    """Replaces the resmom functions of the pbs module"""
+
+    FUNCTIONS = ['openrm', 'closerm', 'addreq', 'getreq', 'flushreq', 'activereq']
+
+    def __init__(self, module, values):
+        self.module = module
+        self.saved = dict((f, getattr(module, f)) for f in self.FUNCTIONS)
+        self.values = values
+        self.streams = {}
+        self.requests = {}
+        self.pending = {}
+        self.answers = {}
+        self.closed = []
+        self.flushes = 0
+        self.silent = set()
+        self.broken = set()
+
+        module.openrm = self.openrm
+        module.closerm = self.closerm
+        module.addreq = self.addreq
+        module.getreq = self.getreq
+        module.flushreq = self.flushreq
+        module.activereq = self.activereq
+
+    def openrm(self, host, port):
+        if host not in self.values:
+            return -1
+        stream = len(self.streams) + 1
+        self.streams[stream] = host
+        self.requests[stream] = []
+        self.pending[stream] = []
+        return stream
+
+    def closerm(self, stream):
+        self.closed.append(stream)
+
+    def addreq(self, stream, keyword):
+        if stream in self.broken:
+            return -1
+        self.requests[stream].append(keyword)
+        self.pending[stream].append(keyword)
+        return 0
+
+    def answer(self, stream):
+        if not self.pending[stream] or self.streams[stream] in self.silent:
+            return
+        values = self.values[self.streams[stream]]
+        self.answers[stream] = ['%s=%s' % (k, values.get(k, '? 15201')) for k in self.pending[stream]]
+        self.pending[stream] = []
+
+    def getreq(self, stream):
+        if stream in self.broken:
+            return None
+        if not self.answers.get(stream):
+            self.answer(stream)
+        if not self.answers.get(stream):
+            return None
+        return self.answers[stream].pop(0)
+
+    def flushreq(self):
+        """The moms answer the requests in reverse order of the streams"""
+        self.flushes += 1
+        for stream in sorted(self.pending.keys(), reverse=True):
+            self.answer(stream)
+
+    def activereq(self):
+        for stream in sorted(self.answers.keys(), reverse=True):
+            if self.answers[stream] and stream not in self.closed:
+                return stream
+        return -1
+
+    def restore(self):
+        for name, func in self.saved.items():
+            setattr(self.module, name, func)
+
+
+class TestResmomUnit(unittest.TestCase):
+    def setUp(self):
+        self.moms = _FakeMoms(resmom.pbs, {
+            'node1': {'loadave': '0.50', 'arch': 'linux'},
+            'node2': {'loadave': '1.00', 'arch': 'linux'},
+            'node3': {'loadave': '2.00', 'arch': 'linux', 'note': 'a=b'},
+            'slow': {},
+        })
+        self.moms.silent.add('slow')
+
+    def tearDown(self):
+        self.moms.restore()
+
+    def test_parse_response(self):
+        self.assertEqual(resmom.parse_response('loadave=0.50'), ('loadave', '0.50'))
+        self.assertEqual(resmom.parse_response('note = a=b'), ('note', 'a=b'))
+        self.assertEqual(resmom.parse_response('foo=? 15201'), None)
+        self.assertEqual(resmom.parse_response(None), None)
+        self.assertEqual(resmom.parse_response('foo'), None)
+        self.assertEqual(resmom.parse_response('foo= '), None)
+
+    def test_poll(self):
+        poller = resmom.MomPoller(['loadave', 'note'], timeout=0.1, window=2)
+        results = list(poller.poll(['node1', 'node2', 'down', 'node3', 'slow']))
+
+        self.assertEqual([(r[0], r[2]) for r in results],
+                         [('node2', None), ('down', 'can not connect to the mom'), ('node3', None),
+                          ('node1', None), ('slow', 'timeout after 0.1 seconds')])
+        self.assertEqual(results[0][1], {'loadave': '1.00'})
+        self.assertEqual(results[2][1], {'loadave': '2.00', 'note': 'a=b'})
+        self.assertEqual(self.moms.requests[1], ['loadave', 'note'])
+        self.assertEqual(sorted(self.moms.closed), [1, 2, 3, 4])
+        self.assertEqual(self.moms.flushes, 3)
+
+        values = resmom.MomPoller(['arch'], timeout=0.1).poll_all(['node1', 'slow'])
+        self.assertEqual(values, {'node1': {'arch': 'linux'}, 'slow': None})
+
+    def test_poll_unknown_stream(self):
+        # A late answer of a mom that is no longer polled
+        #
+        self.moms.streams[99] = 'node2'
+        self.moms.answers[99] = ['loadave=1.00']
+
+        poller = resmom.MomPoller(['loadave'], timeout=1)
+        start = time.time()
+        self.assertEqual(poller.poll_all(['node1']), {'node1': {'loadave': '0.50'}})
+        self.assertTrue(time.time() - start < 0.5)
+        self.assertTrue(99 in self.moms.closed)
+
+    def test_connection_cache(self):
+        cache = resmom.MomConnectionCache()
+        poller = resmom.MomPoller(['loadave'], timeout=0.1, connections=cache)
+
+        first = poller.poll_all(['node1', 'node2'])
+        second = poller.poll_all(['node1', 'node2'])
+        self.assertEqual(first, {'node1': {'loadave': '0.50'}, 'node2': {'loadave': '1.00'}})
+        self.assertEqual(second, first)
+        self.assertEqual(len(self.moms.streams), 2)
+        self.assertEqual(self.moms.closed, [])
+        self.assertEqual(cache.stats(), {'hits': 2, 'misses': 2, 'broken': 0, 'evictions': 0, 'open': 2})
+
+        self.assertEqual(cache.query('node3', ['arch', 'note']), {'arch': 'linux', 'note': 'a=b'})
+        self.assertEqual(cache.query('down', ['arch']), None)
+
+        cache.close()
+        self.assertEqual(sorted(self.moms.closed), [1, 2, 3])
+        self.assertEqual(cache.stats()['open'], 0)
+
+    def test_connection_cache_reconnect(self):
+        cache = resmom.MomConnectionCache()
+        poller = resmom.MomPoller(['loadave'], timeout=0.1, connections=cache)
+        stream = cache.get('node1')
+
+        # The mom closed the connection, the next request uses a new one
+        #
+        self.moms.broken.add(stream)
+        self.assertEqual(poller.poll_all(['node1']), {'node1': {'loadave': '0.50'}})
+        self.assertEqual(self.moms.closed, [stream])
+
+        self.moms.broken.add(cache.get('node1'))
+        self.assertEqual(cache.query('node1', ['arch']), {'arch': 'linux'})
+        self.assertEqual(cache.stats()['broken'], 2)
+        self.assertEqual(len(self.moms.streams), 3)
+
+    def test_connection_cache_limits(self):
+        cache = resmom.MomConnectionCache(max_connections=2)
+        s1 = cache.get('node1')
+        s2 = cache.get('node2')
+        self.assertEqual(cache.get('node1'), s1)
+        s3 = cache.get('node3')
+
+        # node2 was used least recently
+        #
+        self.assertEqual(self.moms.closed, [s2])
+        self.assertEqual(cache.get('node1'), s1)
+        self.assertEqual(cache.get('node3'), s3)
+
+        cache.idle_timeout = 0
+        cache.expire()
+        self.assertEqual(sorted(self.moms.closed), [s1, s2, s3])
+        self.assertEqual(cache.stats()['evictions'], 3)